@@ -0,0 +1,8 @@
+#!/bin/bash
+
+# The popularity metrics of `bigquery.sql` live outside of this build context,
+# the image build turns them into the popularity priors of the index
+cp ../bigquery.jsonl package_metrics.jsonl
+
+# Build the Docker image
+docker build -t demo_frontend . "$@"
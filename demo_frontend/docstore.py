@@ -0,0 +1,59 @@
+"""Memory-mapped store of the mined function bodies, one UTF-8 blob plus byte offsets."""
+
+import mmap
+import os
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+BLOB_FILE = "docs.bin"
+OFFSETS_FILE = "doc_offsets.npy"
+
+
+class DocStoreWriter:
+    def __init__(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._blob = open(os.path.join(directory, BLOB_FILE), "wb")
+        self._offsets = [0]
+
+    def write(self, texts: Iterable[Optional[str]]) -> None:
+        for text in texts:
+            data = (text or "").encode("utf-8", "surrogatepass")
+            self._blob.write(data)
+            self._offsets.append(self._offsets[-1] + len(data))
+
+    def close(self) -> None:
+        self._blob.close()
+        np.save(os.path.join(self.directory, OFFSETS_FILE), np.array(self._offsets, dtype=np.int64))
+
+    def __enter__(self) -> "DocStoreWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def docstore_exists(directory: str) -> bool:
+    return all(os.path.exists(os.path.join(directory, name)) for name in (BLOB_FILE, OFFSETS_FILE))
+
+
+class DocStore:
+    def __init__(self, directory: str) -> None:
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(directory, BLOB_FILE), "rb") as f:
+            # an empty file cannot be mapped
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, key: int) -> str:
+        return self.get([key])[0]
+
+    def get(self, keys: Sequence[int]) -> list[str]:
+        """Decodes the documents of `keys` in the given order."""
+        keys = np.asarray(keys, dtype=np.int64)
+        starts = self.offsets[keys]
+        ends = self.offsets[keys + 1]
+        return [self._blob[start:end].decode("utf-8", "surrogatepass") for start, end in zip(starts, ends)]
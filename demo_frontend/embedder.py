@@ -0,0 +1,81 @@
+"""Query embedder that keeps one infinity engine and event loop alive and micro-batches concurrent requests."""
+
+import asyncio
+import threading
+from typing import Optional
+
+import numpy as np
+
+
+class QueryEmbedder:
+    def __init__(self, engine, max_batch_size: int = 64, max_wait: float = 0.002) -> None:
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        # how long the first request of a micro-batch waits for company, in seconds
+        self.max_wait = max_wait
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="query-embedder", daemon=True)
+        self._thread.start()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    async def _start(self) -> None:
+        await self.engine.astart()
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._work())
+
+    async def _next_batch(self) -> list[tuple[list[str], asyncio.Future]]:
+        requests = [await self._queue.get()]
+        size = len(requests[0][0])
+        deadline = self.loop.time() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - self.loop.time()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            requests.append(request)
+            size += len(request[0])
+        return requests
+
+    async def _work(self) -> None:
+        while True:
+            requests = await self._next_batch()
+            sentences = [text for texts, _ in requests for text in texts]
+            try:
+                embeddings, _ = await self.engine.embed(sentences=sentences)
+            except Exception as e:
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            start = 0
+            for texts, future in requests:
+                if not future.done():
+                    future.set_result(embeddings[start : start + len(texts)])
+                start += len(texts)
+
+    async def _submit(self, texts: list[str]) -> np.ndarray:
+        future = self.loop.create_future()
+        await self._queue.put((list(texts), future))
+        return await future
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Embeds `texts`, safe to call from any number of threads at once."""
+        return asyncio.run_coroutine_threadsafe(self._submit(texts), self.loop).result()
+
+    async def _stop(self) -> None:
+        self._worker.cancel()
+        await self.engine.astop()
+
+    def close(self) -> None:
+        if not self.loop.is_running():
+            return
+        asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
@@ -0,0 +1,113 @@
+"""Builds the usearch index and its lookup tables once, `search.py` memory-maps them at startup."""
+
+import argparse
+import os
+from typing import Optional
+
+import numpy as np
+from usearch.index import Index
+
+from docstore import DocStoreWriter, docstore_exists
+from lexical import LexicalIndexBuilder, document_text
+from names import NameIndex
+from packages import VECTORS_FILE, PackageFilter, normalize
+from popularity import PRIORS_FILE, load_package_metrics, package_priors
+
+DATASET = "michaelfeil/mined_docstrings_pypi_embedded"
+INDEX_DIR = os.environ.get("INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "index"))
+INDEX_FILE = "index.usearch"
+DOC_IDS_FILE = "doc_ids.npy"
+# BigQuery export of `bigquery.sql` with the popularity metrics per package, copied in by `build.sh`
+METRICS_PATH = os.environ.get("PACKAGE_METRICS")
+
+
+def make_index(ndim: int) -> Index:
+    return Index(
+        ndim=ndim,  # Define the number of dimensions in input vectors
+        metric="cos",  # Choose 'l2sq', 'haversine' or other metric, default = 'ip'
+        dtype="f16",  # Quantize to 'f16' or 'i8' if needed, default = 'f32'
+        connectivity=16,  # How frequent should the connections in the graph be, optional
+        expansion_add=128,  # Control the recall of indexing, optional
+        expansion_search=64,  # Control the quality of search, optional
+    )
+
+
+def index_exists(index_dir: str = INDEX_DIR) -> bool:
+    files_exist = all(os.path.exists(os.path.join(index_dir, name)) for name in (INDEX_FILE, DOC_IDS_FILE))
+    return files_exist and docstore_exists(index_dir)
+
+
+# mined columns tokenized by the lexical index
+LEXICAL_COLUMNS = ("package", "name", "signature", "docstring", "qualname")
+
+
+def lexical_texts(columns: dict, num_rows: int) -> list[str]:
+    # older exports may lack some of the mined columns
+    fields = [columns.get(name) or [None] * num_rows for name in LEXICAL_COLUMNS]
+    return [document_text(*row) for row in zip(*fields)]
+
+
+def build_index(ds, out_dir: str = INDEX_DIR, chunk_rows: int = 16384, metrics_path: Optional[str] = METRICS_PATH) -> Index:
+    """
+    adds `ds["embed_func_code"]` chunk by chunk, so only one chunk is held as a dense array
+    documents are sorted by package, index key `k` is row `k` of every saved table
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    column_names = getattr(ds, "column_names", [])
+    packages = PackageFilter.from_packages(ds["package"] if "package" in column_names else [None] * len(ds))
+    # index key -> dataset row
+    doc_ids = np.argsort(packages.codes, kind="stable").astype(np.int64)
+    packages = PackageFilter(packages.names, packages.codes[doc_ids])
+    index = None
+    vectors = None
+    lexical = LexicalIndexBuilder()
+    names = NameIndex()
+    with DocStoreWriter(out_dir) as docs:
+        for start in range(0, len(ds), chunk_rows):
+            keys = np.arange(start, min(start + chunk_rows, len(ds)))
+            chunk = ds[doc_ids[keys].tolist()]
+            embeddings = np.asarray(chunk["embed_func_code"], dtype=np.float32)
+            if index is None:
+                index = make_index(embeddings.shape[-1])
+                vectors = np.lib.format.open_memmap(
+                    os.path.join(out_dir, VECTORS_FILE), mode="w+", dtype=np.float16, shape=(len(ds), embeddings.shape[-1])
+                )
+            index.add(keys, embeddings)
+            vectors[keys] = normalize(embeddings)
+            docs.write(chunk["code"])
+            lexical.add(lexical_texts(chunk, len(embeddings)))
+            if "name" in chunk:
+                names.add(chunk.get("package") or [None] * len(embeddings), chunk["name"], chunk.get("qualname"), start)
+            print(f"indexed {start + len(embeddings)} of {len(ds)} vectors")
+    if vectors is not None:
+        vectors.flush()
+    index.save(os.path.join(out_dir, INDEX_FILE))
+    np.save(os.path.join(out_dir, DOC_IDS_FILE), doc_ids)
+    lexical.build().save(out_dir)
+    names.save(out_dir)
+    packages.save(out_dir)
+    if metrics_path and not os.path.exists(metrics_path):
+        print(f"{metrics_path} not found, building without popularity priors")
+    elif metrics_path:
+        priors = package_priors(packages.names, load_package_metrics(metrics_path))
+        np.save(os.path.join(out_dir, PRIORS_FILE), priors[packages.codes])
+    return index
+
+
+def load_index(index_dir: str = INDEX_DIR) -> tuple[Index, np.ndarray]:
+    """memory-maps the saved index and its key -> dataset row table, used for provenance only"""
+    index = Index.restore(os.path.join(index_dir, INDEX_FILE), view=True)
+    doc_ids = np.load(os.path.join(index_dir, DOC_IDS_FILE), mmap_mode="r")
+    return index, doc_ids
+
+
+if __name__ == "__main__":
+    import datasets
+
+    parser = argparse.ArgumentParser(description="Build and save the usearch index served by the demo")
+    parser.add_argument("--dataset", type=str, help="Hugging Face dataset with embed_func_code", default=DATASET)
+    parser.add_argument("--out", type=str, help="Output directory", default=INDEX_DIR)
+    parser.add_argument("--metrics", type=str, help="BigQuery jsonl export with popularity metrics", default=METRICS_PATH)
+    args = parser.parse_args()
+    build_index(datasets.load_dataset(args.dataset)["train"], args.out, metrics_path=args.metrics)
+    print(f"index saved to {args.out}")
@@ -0,0 +1,145 @@
+"""BM25 inverted index over the mined names, signatures and docstrings, fused with vector search by RRF."""
+
+import json
+import os
+import re
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+VOCAB_FILE = "lexical_vocab.json"
+ARRAYS = ("term_offsets", "docs", "tfs", "doc_lengths")
+_TOKEN = re.compile(r"\w+(?:\.\w+)*")
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    tokens = []
+    for token in _TOKEN.findall(text.lower()) if text else []:
+        tokens.append(token)
+        if "." in token:
+            tokens.extend(token.split("."))
+    return tokens
+
+
+def document_text(
+    package: Optional[str],
+    name: Optional[str],
+    signature: Optional[str],
+    docstring: Optional[str],
+    qualname: Optional[str] = None,
+) -> str:
+    # the qualified name is one token, so `pandas.core.frame.DataFrame.merge` matches as a whole
+    name = qualname or name
+    qualified = f"{package}.{name}" if package and name else name or ""
+    return " ".join(part for part in (qualified, signature, docstring) if part)
+
+
+class LexicalIndexBuilder:
+    def __init__(self) -> None:
+        self.vocab: dict[str, int] = {}
+        self.num_docs = 0
+        self._chunks: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self._doc_lengths: list[int] = []
+
+    def add(self, texts: Iterable[Optional[str]]) -> None:
+        term_ids, doc_ids, tfs = [], [], []
+        for text in texts:
+            counts: dict[int, int] = {}
+            tokens = tokenize(text)
+            for token in tokens:
+                term = self.vocab.setdefault(token, len(self.vocab))
+                counts[term] = counts.get(term, 0) + 1
+            term_ids.extend(counts)
+            tfs.extend(counts.values())
+            doc_ids.extend([self.num_docs] * len(counts))
+            self._doc_lengths.append(len(tokens))
+            self.num_docs += 1
+        # per chunk arrays instead of per term lists keep the build in a few bytes per posting
+        self._chunks.append(
+            (np.array(term_ids, dtype=np.int32), np.array(doc_ids, dtype=np.int32), np.array(tfs, dtype=np.uint32))
+        )
+
+    def build(self) -> "LexicalIndex":
+        term_ids = np.concatenate([c[0] for c in self._chunks]) if self._chunks else np.empty(0, np.int32)
+        doc_ids = np.concatenate([c[1] for c in self._chunks]) if self._chunks else np.empty(0, np.int32)
+        tfs = np.concatenate([c[2] for c in self._chunks]) if self._chunks else np.empty(0, np.uint32)
+        # documents are added in order, so a stable sort by term keeps every posting list sorted by document
+        order = np.argsort(term_ids, kind="stable")
+        term_offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(self.vocab)), out=term_offsets[1:])
+        return LexicalIndex(
+            self.vocab, term_offsets, doc_ids[order], tfs[order], np.array(self._doc_lengths, dtype=np.int32)
+        )
+
+
+class LexicalIndex:
+    def __init__(
+        self,
+        vocab: dict[str, int],
+        term_offsets: np.ndarray,
+        docs: np.ndarray,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> None:
+        self.vocab = vocab
+        self.term_offsets = term_offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(doc_lengths)
+        average_length = float(doc_lengths.mean()) if self.num_docs else 1.0
+        # per document part of the BM25 denominator, computed once
+        self._length_norm = (k1 * (1 - b + b * doc_lengths / max(average_length, 1.0))).astype(np.float32)
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, VOCAB_FILE), "w") as f:
+            json.dump(self.vocab, f)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"lexical_{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str) -> "LexicalIndex":
+        with open(os.path.join(directory, VOCAB_FILE)) as f:
+            vocab = json.load(f)
+        arrays = [np.load(os.path.join(directory, f"lexical_{name}.npy"), mmap_mode="r") for name in ARRAYS]
+        return cls(vocab, *arrays)
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        names = [VOCAB_FILE] + [f"lexical_{name}.npy" for name in ARRAYS]
+        return all(os.path.exists(os.path.join(directory, name)) for name in names)
+
+    def search(self, query: str, k: int = 10) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the top `k` documents by BM25 score and their scores, best first."""
+        terms = {self.vocab[token] for token in tokenize(query) if token in self.vocab}
+        candidates, scores = [], []
+        for term in terms:
+            start, end = self.term_offsets[term], self.term_offsets[term + 1]
+            docs = np.asarray(self.docs[start:end])
+            tfs = np.asarray(self.tfs[start:end], dtype=np.float32)
+            idf = np.log(1.0 + (self.num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            candidates.append(docs)
+            scores.append(idf * tfs * (self.k1 + 1) / (tfs + self._length_norm[docs]))
+        if not candidates:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        # sum the scores of documents matching several terms
+        docs, inverse = np.unique(np.concatenate(candidates), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores)).astype(np.float32)
+        top = np.argpartition(-totals, k - 1)[:k] if len(totals) > k else np.arange(len(totals))
+        top = top[np.argsort(-totals[top], kind="stable")]
+        return docs[top].astype(np.int64), totals[top]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[np.ndarray], k: int = 10, c: int = 60) -> np.ndarray:
+    """merges rankings of document ids with `sum(1 / (c + rank))`, best first"""
+    scores: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking.tolist()):
+            scores[doc] = scores.get(doc, 0.0) + 1.0 / (c + rank + 1)
+    fused = sorted(scores, key=scores.get, reverse=True)[:k]
+    return np.array(fused, dtype=np.int64)
@@ -0,0 +1,60 @@
+"""Exact lookup of dotted API names such as `pandas.DataFrame.merge`, without the embedding model."""
+
+import itertools
+import json
+import os
+import re
+from typing import Iterable, Optional
+
+import numpy as np
+
+NAMES_FILE = "names.json"
+# `pandas.DataFrame.merge` or `pandas.DataFrame.merge(left, right)`, bare names go to vector search
+_QUALIFIED_NAME = re.compile(r"^\s*(\w+(?:\.\w+)+)\s*(?:\(.*\))?\s*$")
+
+
+class NameIndex:
+    def __init__(self, names: Optional[dict[str, list[int]]] = None) -> None:
+        self.names: dict[str, list[int]] = names or {}
+
+    def add(
+        self,
+        modules: Iterable[Optional[str]],
+        names: Iterable[Optional[str]],
+        qualnames: Optional[Iterable[Optional[str]]] = None,
+        start_row: int = 0,
+    ) -> None:
+        """
+        indexes `top_level.qualname` and `module.qualname` of every row,
+        e.g. `pandas.DataFrame.merge` and `pandas.core.frame.DataFrame.merge`
+        """
+        qualnames = qualnames if qualnames is not None else itertools.repeat(None)
+        for row, (module, name, qualname) in enumerate(zip(modules, names, qualnames), start_row):
+            qualname = qualname or name
+            if not module or not qualname:
+                continue
+            module = module.lower().replace("-", "_")
+            qualname = qualname.lower()
+            keys = {f"{module.split('.')[0]}.{qualname}", f"{module}.{qualname}"}
+            for key in keys:
+                self.names.setdefault(key, []).append(row)
+
+    def lookup(self, query: str) -> np.ndarray:
+        """Returns the rows defining the dotted name in `query`, empty if it is not a known name."""
+        match = _QUALIFIED_NAME.match(query)
+        rows = self.names.get(match.group(1).lower()) if match else None
+        return np.array(rows or [], dtype=np.int64)
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, NAMES_FILE), "w") as f:
+            json.dump(self.names, f)
+
+    @classmethod
+    def load(cls, directory: str) -> "NameIndex":
+        with open(os.path.join(directory, NAMES_FILE)) as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, NAMES_FILE))
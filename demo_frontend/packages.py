@@ -0,0 +1,104 @@
+"""Package-filtered exact search over the contiguous, package-sorted key ranges of the index."""
+
+import bisect
+import json
+import os
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+PACKAGES_FILE = "packages.json"
+CODES_FILE = "package_codes.npy"
+VECTORS_FILE = "vectors.npy"
+
+
+class PackageFilter:
+    def __init__(self, names: list[str], codes: np.ndarray) -> None:
+        # sorted module names of the `package` column, a module's code is its position
+        self.names = names
+        # module code per row
+        self.codes = codes
+        self.is_sorted = bool(len(codes) < 2 or (np.diff(codes) >= 0).all())
+
+    @classmethod
+    def from_packages(cls, packages: Iterable[Optional[str]]) -> "PackageFilter":
+        packages = [package or "" for package in packages]
+        names = sorted(set(packages))
+        code_of = {name: code for code, name in enumerate(names)}
+        return cls(names, np.array([code_of[package] for package in packages], dtype=np.int32))
+
+    def save(self, directory: str) -> None:
+        with open(os.path.join(directory, PACKAGES_FILE), "w") as f:
+            json.dump(self.names, f)
+        np.save(os.path.join(directory, CODES_FILE), self.codes)
+
+    @classmethod
+    def load(cls, directory: str) -> "PackageFilter":
+        with open(os.path.join(directory, PACKAGES_FILE)) as f:
+            names = json.load(f)
+        return cls(names, np.load(os.path.join(directory, CODES_FILE), mmap_mode="r"))
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return all(os.path.exists(os.path.join(directory, name)) for name in (PACKAGES_FILE, CODES_FILE, VECTORS_FILE))
+
+    def _code_ranges(self, packages: Sequence[str]) -> list[tuple[int, int]]:
+        # `pandas` selects `pandas` and every `pandas.*` module: the names in `[pkg, pkg + "/")`,
+        # since "/" sorts right after "." (see `corpus._corpus_filter`)
+        ranges = []
+        for package in sorted({package.replace("-", "_") for package in packages}):
+            start = bisect.bisect_left(self.names, package)
+            end = bisect.bisect_left(self.names, package + "/")
+            if start < end:
+                ranges.append((start, end))
+        return ranges
+
+    def rows(self, packages: Sequence[str]) -> np.ndarray:
+        """All rows of the top-level `packages`, read from contiguous ranges when the rows are sorted."""
+        ranges = self._code_ranges(packages)
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        if not self.is_sorted:
+            return np.flatnonzero(self._in_ranges(self.codes, ranges))
+        bounds = np.searchsorted(self.codes, np.array(ranges).ravel(), side="left").reshape(-1, 2)
+        return np.concatenate([np.arange(start, end) for start, end in bounds])
+
+    def keep(self, rows: np.ndarray, packages: Sequence[str]) -> np.ndarray:
+        """The `rows` belonging to the top-level `packages`, in their original order."""
+        return rows[self._in_ranges(np.asarray(self.codes[rows]), self._code_ranges(packages))]
+
+    @staticmethod
+    def _in_ranges(codes: np.ndarray, ranges: list[tuple[int, int]]) -> np.ndarray:
+        mask = np.zeros(len(codes), dtype=bool)
+        for start, end in ranges:
+            mask |= (codes >= start) & (codes < end)
+        return mask
+
+
+def test_package_filter_matches_submodules():
+    modules = ["pandas.core.frame", "numpy", "pandas", "pandas_datareader.io", "pandas.io.parquet", "fastparquet.api"]
+    packages = PackageFilter.from_packages(modules)
+    order = np.argsort(packages.codes, kind="stable")
+    for codes in (packages.codes, packages.codes[order]):
+        package_filter = PackageFilter(packages.names, codes)
+        rows = package_filter.rows(["pandas"])
+        names = sorted(package_filter.names[code] for code in codes[rows])
+        assert names == ["pandas", "pandas.core.frame", "pandas.io.parquet"]
+        assert [package_filter.names[c] for c in codes[package_filter.rows(["fastparquet"])]] == ["fastparquet.api"]
+        assert len(package_filter.keep(np.arange(len(modules)), ["pandas-datareader"])) == 1
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def exact_search(vectors: np.ndarray, query: np.ndarray, rows: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """the top `k` of `rows` by cosine similarity and their similarities, `vectors` must be unit-normalized"""
+    if not len(rows):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    similarity = np.asarray(vectors[rows], dtype=np.float32) @ normalize(query)
+    top = np.argpartition(-similarity, k - 1)[:k] if len(rows) > k else np.arange(len(rows))
+    top = top[np.argsort(-similarity[top], kind="stable")]
+    return rows[top].astype(np.int64), similarity[top]
@@ -0,0 +1,105 @@
+"""Per-package popularity priors from the `bigquery.sql` export, blended into the similarity of vector candidates."""
+
+import json
+import os
+import re
+from typing import Optional, Sequence
+
+import numpy as np
+
+PRIORS_FILE = "priors.npy"
+# metric -> weight in the prior, recent downloads count more than stale popularity
+METRIC_WEIGHTS = {
+    "pypi_downloads": 0.3,
+    "downloads_2023": 0.4,
+    "watch_count": 0.2,
+    "code_bytes_python": 0.1,
+}
+
+
+# top-level import name -> PyPI distribution, where the two differ
+IMPORT_TO_DISTRIBUTION = {
+    "sklearn": "scikit-learn",
+    "skimage": "scikit-image",
+    "PIL": "pillow",
+    "cv2": "opencv-python",
+    "yaml": "pyyaml",
+    "bs4": "beautifulsoup4",
+    "dateutil": "python-dateutil",
+    "attr": "attrs",
+    "jwt": "pyjwt",
+    "dotenv": "python-dotenv",
+    "Crypto": "pycryptodome",
+    "OpenSSL": "pyopenssl",
+    "serial": "pyserial",
+    "magic": "python-magic",
+    "docx": "python-docx",
+    "pptx": "python-pptx",
+    "git": "gitpython",
+    "usb": "pyusb",
+    "zmq": "pyzmq",
+    "MySQLdb": "mysqlclient",
+    "Levenshtein": "python-levenshtein",
+    "fitz": "pymupdf",
+    "faiss": "faiss-cpu",
+}
+
+
+def distribution_name(module: str) -> str:
+    """PyPI distribution of a mined module path, `sklearn.linear_model` -> `scikit-learn`."""
+    top = module.split(".")[0]
+    return normalize_name(IMPORT_TO_DISTRIBUTION.get(top, top))
+
+
+def normalize_name(name: str) -> str:
+    # PEP 503, the mined `package` column and `pypi_name` may differ in case and separators
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def load_package_metrics(path: str) -> dict[str, np.ndarray]:
+    """Reads the metrics of `METRIC_WEIGHTS` per package from the BigQuery jsonl export."""
+    metrics = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if not row.get("pypi_name"):
+                continue
+            # BigQuery exports INT64 columns as strings in JSON, missing joins as null
+            metrics[normalize_name(row["pypi_name"])] = np.array(
+                [float(row.get(metric) or 0) for metric in METRIC_WEIGHTS], dtype=np.float64
+            )
+    return metrics
+
+
+def package_priors(package_names: Sequence[str], metrics: dict[str, np.ndarray]) -> np.ndarray:
+    """Prior in [0, 1] per mined module, the one of its distribution, 0 for distributions missing from `metrics`."""
+    values = np.zeros((len(package_names), len(METRIC_WEIGHTS)), dtype=np.float64)
+    for code, name in enumerate(package_names):
+        if name and distribution_name(name) in metrics:
+            values[code] = metrics[distribution_name(name)]
+    scaled = np.log1p(np.maximum(values, 0))
+    scaled /= np.maximum(scaled.max(axis=0), 1e-12)
+    return (scaled @ np.array(list(METRIC_WEIGHTS.values()))).astype(np.float32)
+
+
+def test_package_priors_by_distribution():
+    metrics = {"pandas": np.array([10.0, 10.0, 10.0, 10.0]), "scikit-learn": np.array([5.0, 5.0, 5.0, 5.0])}
+    priors = package_priors(["pandas.core.frame", "pandas", "sklearn.linear_model", "pandas_datareader", ""], metrics)
+    assert priors[0] == priors[1] == 1.0
+    assert 0 < priors[2] < 1
+    assert priors[3] == priors[4] == 0
+
+
+def load_priors(directory: str) -> Optional[np.ndarray]:
+    path = os.path.join(directory, PRIORS_FILE)
+    return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+
+def rerank(rows: np.ndarray, similarity: np.ndarray, priors: np.ndarray, weight: float = 0.05) -> np.ndarray:
+    """orders candidate `rows` by `similarity + weight * prior`, best first"""
+    if not len(rows):
+        return rows
+    scores = similarity + weight * priors[rows]
+    return rows[np.argsort(-scores, kind="stable")]
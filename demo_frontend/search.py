@@ -1,42 +1,77 @@
 from infinity_emb import AsyncEmbeddingEngine, EngineArgs
 import numpy as np
-from usearch.index import Index, Matches
-import asyncio
+from usearch.index import Matches
+import atexit
+import os
+import re
+from typing import Optional
 import datasets
 
-engine = AsyncEmbeddingEngine.from_args(
-    EngineArgs(
-        model_name_or_path="michaelfeil/jina-embeddings-v2-base-code",
-        batch_size=8,     
+from docstore import DocStore
+from embedder import QueryEmbedder
+from index_store import DATASET, INDEX_DIR, LEXICAL_COLUMNS, METRICS_PATH, index_exists, lexical_texts, load_index, make_index
+from lexical import LexicalIndex, LexicalIndexBuilder, reciprocal_rank_fusion
+from names import NameIndex
+from packages import VECTORS_FILE, PackageFilter, exact_search, normalize
+from popularity import load_package_metrics, load_priors, package_priors, rerank
+from query_cache import TTLCache
+
+# started once, all queries share its event loop and micro-batches
+embedder = QueryEmbedder(
+    AsyncEmbeddingEngine.from_args(
+        EngineArgs(
+            model_name_or_path="michaelfeil/jina-embeddings-v2-base-code",
+            batch_size=8,     
+        )
     )
 )
+atexit.register(embedder.close)
 
 
-async def embed_texts(texts: list[str]) -> np.ndarray:
-    async with engine:
-        embeddings = (await engine.embed(texts))[0]
-        return np.array(embeddings)
-
 def embed_texts_sync(texts: list[str]) -> np.ndarray:
-    loop =  asyncio.new_event_loop()
-    return loop.run_until_complete(embed_texts(texts))
+    return embedder.embed(texts)
 
 index = None
+# documents by index key
 docs_index = None
+# BM25 index over the rows of `docs_index`
+lexical = None
+# qualified name -> rows of `docs_index`
+name_index = None
+# package of every row and the unit-normalized vectors for filtered search
+package_filter = None
+vectors = None
+# popularity prior per row, blended into the cosine similarity of vector candidates
+priors = None
+POPULARITY_WEIGHT = 0.05
+
+# repeated and concurrent identical queries skip the model and the search
+embedding_cache = TTLCache(maxsize=4096, ttl=3600.0)
+result_cache = TTLCache(maxsize=1024, ttl=600.0)
+
+# candidates per retriever that are fused into the final top k
+NUM_CANDIDATES = 50
+# `torch.mul` or `torch.mul(*demo2)`, answered from the lexical index alone; bare words like `sort` also use vectors
+IDENTIFIER_QUERY = re.compile(r"^\s*\w+(\.\w+)+\s*(\(.*\))?\s*$")
 
 
 def build_index(demo_mode=False):
-    global index, docs_index
-    index = Index(
-        ndim=embed_texts_sync(["Hi"]).shape[
-            -1
-        ],  # Define the number of dimensions in input vectors
-        metric="cos",  # Choose 'l2sq', 'haversine' or other metric, default = 'ip'
-        dtype="f16",  # Quantize to 'f16' or 'i8' if needed, default = 'f32'
-        connectivity=16,  # How frequent should the connections in the graph be, optional
-        expansion_add=128,  # Control the recall of indexing, optional
-        expansion_search=64,  # Control the quality of search, optional
-    )
+    global index, docs_index, lexical, name_index, package_filter, vectors, priors
+    if not demo_mode and index_exists():
+        # built offline by `index_store.py`, memory-mapped instead of re-indexed
+        index, _ = load_index()
+        docs_index = DocStore(INDEX_DIR)
+        if LexicalIndex.exists(INDEX_DIR):
+            lexical = LexicalIndex.load(INDEX_DIR)
+        if NameIndex.exists(INDEX_DIR):
+            name_index = NameIndex.load(INDEX_DIR)
+        if PackageFilter.exists(INDEX_DIR):
+            package_filter = PackageFilter.load(INDEX_DIR)
+            vectors = np.load(os.path.join(INDEX_DIR, VECTORS_FILE), mmap_mode="r")
+        priors = load_priors(INDEX_DIR)
+        print(f"usearch index with {len(index)} vectors loaded.")
+        return
+    index = make_index(embed_texts_sync(["Hi"]).shape[-1])
     if demo_mode:
         docs_index = [
             """def HttpClient( host: str = "localhost", port: int = 8000, ssl: bool = False, headers: Optional[Dict[str, str]] = None, settings: Optional[Settings] = None, tenant: str = DEFAULT_TENANT, database: str = DEFAULT_DATABASE, ) -> ClientAPI:  Creates a client that connects to a remote Chroma server. This supports many clients connecting to the same server, and is the recommended way to use Chroma in production. Args: host: The hostname of the Chroma server. Defaults to "localhost". port: The port of the Chroma server. Defaults to "8000". ssl: Whether to use SSL to connect to the Chroma server. Defaults to False. headers: A dictionary of headers to send to the Chroma server. Defaults to {}. settings: A dictionary of settings to communicate with the chroma server. tenant: The tenant to use for this client. Defaults to the default tenant. database: The database to use for this client. Defaults to the default database.  if settings is None: settings = Settings() # Make sure paramaters are the correct types -- users can pass anything. host = str(host) port = int(port) ssl = bool(ssl) tenant = str(tenant) database = str(database) settings.chroma_api_impl = "chromadb.api.fastapi.FastAPI" if settings.chroma_server_host and settings.chroma_server_host != host: raise ValueError( f"Chroma server host provided in settings[{settings.chroma_server_host}] is different to the one provided in HttpClient: [{host}]" ) settings.chroma_server_host = host if settings.chroma_server_http_port and settings.chroma_server_http_port != port: raise ValueError( f"Chroma server http port provided in settings[{settings.chroma_server_http_port}] is different to the one provided in HttpClient: [{port}]" ) settings.chroma_server_http_port = port settings.chroma_server_ssl_enabled = ssl settings.chroma_server_headers = headers return ClientCreator(tenant=tenant, database=database, settings=settings) """,
@@ -46,26 +81,138 @@ def build_index(demo_mode=False):
         ]
         embeddings = embed_texts_sync(docs_index)
         index.add(np.arange(len(docs_index)), embeddings)
+        builder = LexicalIndexBuilder()
+        builder.add(docs_index)
+        lexical = builder.build()
         return
     else:
         print("loading 280k dataset")
-        ds = datasets.load_dataset("michaelfeil/mined_docstrings_pypi_embedded")
+        ds = datasets.load_dataset(DATASET)
         ds = ds["train"]
         docs_index = ds["code"]
         embeddings = np.array(ds["embed_func_code"])
         print("indexing the 280k vectors")
         index.add(np.arange(len(docs_index)), embeddings)
+        builder = LexicalIndexBuilder()
+        # only the text columns, not the embeddings again
+        text_columns = [name for name in LEXICAL_COLUMNS if name in ds.column_names]
+        builder.add(lexical_texts({name: ds[name] for name in text_columns}, len(ds)))
+        lexical = builder.build()
+        if "name" in ds.column_names:
+            name_index = NameIndex()
+            name_index.add(
+                ds["package"] if "package" in ds.column_names else [None] * len(ds),
+                ds["name"],
+                ds["qualname"] if "qualname" in ds.column_names else None,
+            )
+        if "package" in ds.column_names:
+            package_filter = PackageFilter.from_packages(ds["package"])
+            vectors = normalize(embeddings)
+            if METRICS_PATH and os.path.exists(METRICS_PATH):
+                priors = package_priors(package_filter.names, load_package_metrics(METRICS_PATH))[package_filter.codes]
         print("usearch index done.")
 
 if index is None:
     build_index()
 
 
-def answer_query(query: str) -> list[str]:
-    embedding = embed_texts_sync([query])
-    matches = index.search(embedding, 10)
-    texts = [docs_index[match.key] for match in matches]
-    return texts
+def get_docs(rows: np.ndarray) -> list[str]:
+    if isinstance(docs_index, DocStore):
+        return docs_index.get(rows)
+    return [docs_index[row] for row in rows]
+
+
+def embed_queries(queries: list[str]) -> np.ndarray:
+    """embeds the queries missing from `embedding_cache` in one batch"""
+    cached = [embedding_cache.get(query) for query in queries]
+    missing = list(dict.fromkeys(query for query, vector in zip(queries, cached) if vector is None))
+    if missing:
+        new = dict(zip(missing, embed_texts_sync(missing)))
+        for query, vector in new.items():
+            embedding_cache.put(query, vector)
+        cached = [new[query] if vector is None else vector for query, vector in zip(queries, cached)]
+    return np.stack(cached)
+
+
+def vector_search(queries: list[str], k: int, packages: Optional[list[str]] = None) -> list[np.ndarray]:
+    """
+    embeds all queries in one batch and searches them with one multi-threaded call
+    with `packages`, only the rows of those packages are scored, exactly
+    """
+    embeddings = embed_queries(queries)
+    if packages is not None:
+        rows = package_filter.rows(packages)
+        candidates = [exact_search(vectors, embedding, rows, k) for embedding in embeddings]
+    else:
+        matches = index.search(embeddings, k, threads=0)
+        if isinstance(matches, Matches):
+            # usearch returns `Matches` instead of `BatchMatches` for a single query
+            candidates = [(matches.keys, 1 - matches.distances)]
+        else:
+            candidates = [
+                (matches.keys[i, : matches.counts[i]], 1 - matches.distances[i, : matches.counts[i]])
+                for i in range(len(queries))
+            ]
+    if priors is None:
+        return [keys.astype(np.int64) for keys, _ in candidates]
+    return [rerank(keys.astype(np.int64), similarity, priors, POPULARITY_WEIGHT) for keys, similarity in candidates]
+
+
+def rank_queries(queries: list[str], k: int = 10, packages: Optional[list[str]] = None) -> list[np.ndarray]:
+    """
+    fuses BM25 and vector search with reciprocal rank fusion into rows of `docs_index`
+    known qualified names and identifier queries with a lexical match never touch the embedding model
+    """
+    if packages is not None and package_filter is None:
+        raise ValueError("package filters need an index built with the mined `package` column")
+    keep = (lambda rows: package_filter.keep(rows, packages)) if packages is not None else (lambda rows: rows)
+    # filtering drops lexical candidates of other packages, so fetch more of them
+    num_lexical = NUM_CANDIDATES if packages is None else 10 * NUM_CANDIDATES
+    empty = np.empty(0, dtype=np.int64)
+    results = [None] * len(queries)
+    for i, query in enumerate(queries):
+        if name_index is not None:
+            hits = keep(name_index.lookup(query))
+            if len(hits):
+                results[i] = hits[:k]
+    lexical_hits = [
+        keep(lexical.search(query, num_lexical)[0])[:NUM_CANDIDATES] if lexical is not None and results[i] is None else empty
+        for i, query in enumerate(queries)
+    ]
+    to_embed = []
+    for i, query in enumerate(queries):
+        if results[i] is not None:
+            continue
+        if IDENTIFIER_QUERY.match(query) and len(lexical_hits[i]):
+            results[i] = lexical_hits[i][:k]
+        else:
+            to_embed.append(i)
+    if to_embed:
+        vector_hits = vector_search([queries[i] for i in to_embed], NUM_CANDIDATES, packages)
+        for i, hits in zip(to_embed, vector_hits):
+            results[i] = reciprocal_rank_fusion([hits, lexical_hits[i]], k)
+    return results
+
+
+def answer_queries(queries: list[str], k: int = 10, packages: Optional[list[str]] = None) -> list[list[str]]:
+    """
+    returns the top `k` documents per query, repeated queries come from `result_cache`
+    with `packages`, only documents of those packages are returned
+    """
+    filters = tuple(sorted(set(packages))) if packages is not None else None
+    results = [result_cache.get((query, k, filters)) for query in queries]
+    missing = list(dict.fromkeys(query for query, docs in zip(queries, results) if docs is None))
+    if missing:
+        new = {query: get_docs(rows) for query, rows in zip(missing, rank_queries(missing, k, packages))}
+        for query, docs in new.items():
+            result_cache.put((query, k, filters), docs)
+        results = [new[query] if docs is None else docs for query, docs in zip(queries, results)]
+    # callers may modify the lists, the cached ones stay intact
+    return [list(docs) for docs in results]
+
+
+def answer_query(query: str, packages: Optional[list[str]] = None) -> list[str]:
+    return answer_queries([query], 10, packages)[0]
 
 
 if __name__ == "__main__":
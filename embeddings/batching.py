@@ -0,0 +1,52 @@
+"""Packs rows sorted by token length into batches under a padded-token budget."""
+
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+# rough characters per token of code tokenizers, used when no tokenizer is given
+CHARS_PER_TOKEN = 3.5
+
+
+def estimate_tokens(texts: Sequence[str], max_length: int = 8192) -> np.ndarray:
+    lengths = np.fromiter((len(text or "") for text in texts), dtype=np.int64, count=len(texts))
+    return np.clip(np.ceil(lengths / CHARS_PER_TOKEN).astype(np.int64) + 2, 1, max_length)
+
+
+def count_tokens(
+    texts: Sequence[str],
+    tokenizer: Optional[Callable] = None,
+    max_length: int = 8192,
+) -> np.ndarray:
+    """Token length per text, exact with a Hugging Face `tokenizer`, estimated otherwise."""
+    if tokenizer is None:
+        return estimate_tokens(texts, max_length)
+    input_ids = tokenizer(list(texts), truncation=True, max_length=max_length)["input_ids"]
+    return np.array([len(ids) for ids in input_ids], dtype=np.int64)
+
+
+def token_budget_batches(
+    token_lengths: np.ndarray, max_tokens: int = 16384, max_batch_size: int = 256
+) -> list[np.ndarray]:
+    """
+    packs row indices sorted by length into batches with at most `max_tokens` padded tokens
+    a single row longer than the budget gets a batch of its own
+    """
+    order = np.argsort(token_lengths, kind="stable")
+    batches = []
+    start = 0
+    for end in range(1, len(order) + 1):
+        # lengths grow along `order`, so the newest row is the longest of the batch
+        padded = (end - start) * token_lengths[order[end - 1]]
+        if end - start > 1 and (padded > max_tokens or end - start > max_batch_size):
+            batches.append(order[start : end - 1])
+            start = end - 1
+    if start < len(order):
+        batches.append(order[start:])
+    return batches
+
+
+def padding_efficiency(token_lengths: np.ndarray, batches: list[np.ndarray]) -> float:
+    """Share of real tokens among all padded tokens, 1.0 means no padding at all."""
+    padded = sum(len(batch) * token_lengths[batch].max() for batch in batches if len(batch))
+    return float(token_lengths.sum() / padded) if padded else 1.0
@@ -0,0 +1,149 @@
+"""Append-only embedding cache per model, keyed on the blake2b digest of each text."""
+
+import hashlib
+import json
+import os
+import re
+from typing import Callable, Sequence
+
+import numpy as np
+
+DIGEST_SIZE = 16
+# raw digests, numpy sorts and compares them bytewise
+KEY_DTYPE = np.dtype(("V", DIGEST_SIZE))
+
+
+def content_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=DIGEST_SIZE).digest()
+
+
+def _key_array(keys: Sequence[bytes]) -> np.ndarray:
+    return np.frombuffer(b"".join(keys), dtype=KEY_DTYPE)
+
+
+def _save(path: str, array: np.ndarray) -> None:
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(path + ".tmp", path)
+
+
+class EmbeddingCache:
+    def __init__(self, directory: str, model_name: str) -> None:
+        # one directory per model, vectors of different models never mix
+        self.path = os.path.join(directory, re.sub(r"[^\w.-]+", "--", model_name))
+        os.makedirs(self.path, exist_ok=True)
+        # digest per row, in row order
+        self.keys_path = os.path.join(self.path, "keys.bin")
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        # the digests sorted, and the row of each, for `np.searchsorted` lookups
+        self.sorted_keys_path = os.path.join(self.path, "sorted_keys.npy")
+        self.sorted_rows_path = os.path.join(self.path, "sorted_rows.npy")
+        self.meta_path = os.path.join(self.path, "meta.json")
+        self.model_name = model_name
+        self.ndim = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.ndim = json.load(f)["ndim"]
+        self._load()
+
+    def _load(self) -> None:
+        num_keys = os.path.getsize(self.keys_path) // DIGEST_SIZE if os.path.exists(self.keys_path) else 0
+        num_vectors = 0
+        if self.ndim and os.path.exists(self.vectors_path):
+            num_vectors = os.path.getsize(self.vectors_path) // (4 * self.ndim)
+        # vectors are appended before keys, so a crash can only leave extra vectors
+        self.num_rows = min(num_keys, num_vectors)
+        self.sorted_keys = np.empty(0, dtype=KEY_DTYPE)
+        self.sorted_rows = np.empty(0, dtype=np.int64)
+        if os.path.exists(self.sorted_keys_path) and os.path.exists(self.sorted_rows_path):
+            sorted_keys = np.load(self.sorted_keys_path, mmap_mode="r")
+            sorted_rows = np.load(self.sorted_rows_path, mmap_mode="r")
+            # the index covers rows `0..len - 1` and is written last, it may only lag behind
+            if len(sorted_keys) == len(sorted_rows) <= self.num_rows:
+                self.sorted_keys, self.sorted_rows = sorted_keys, sorted_rows
+        indexed = len(self.sorted_rows)
+        if indexed < self.num_rows:
+            keys = np.memmap(self.keys_path, dtype=KEY_DTYPE, mode="r", shape=(self.num_rows,))
+            self._merge(np.array(keys[indexed:]), np.arange(indexed, self.num_rows))
+        self._map()
+
+    def _map(self) -> None:
+        self.vectors = (
+            np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.num_rows, self.ndim))
+            if self.num_rows
+            else None
+        )
+
+    def _merge(self, keys: np.ndarray, rows: np.ndarray) -> None:
+        # insert the new keys into the sorted ones, one linear pass instead of a re-sort
+        order = np.argsort(keys, kind="stable")
+        at = np.searchsorted(self.sorted_keys, keys[order])
+        _save(self.sorted_keys_path, np.insert(self.sorted_keys, at, keys[order]))
+        _save(self.sorted_rows_path, np.insert(self.sorted_rows, at, rows[order]))
+        self.sorted_keys = np.load(self.sorted_keys_path, mmap_mode="r")
+        self.sorted_rows = np.load(self.sorted_rows_path, mmap_mode="r")
+
+    def _find(self, keys: np.ndarray) -> np.ndarray:
+        if not len(self.sorted_keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        at = np.minimum(np.searchsorted(self.sorted_keys, keys), len(self.sorted_keys) - 1)
+        return np.where(self.sorted_keys[at] == keys, self.sorted_rows[at], -1).astype(np.int64)
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def lookup(self, keys: Sequence[bytes]) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the cache row per key, -1 if missing, and the mask of found keys."""
+        rows = self._find(_key_array(keys))
+        return rows, rows >= 0
+
+    def add(self, keys: Sequence[bytes], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.ndim is None:
+            self.ndim = vectors.shape[1]
+            with open(self.meta_path, "w") as f:
+                json.dump({"model_name": self.model_name, "ndim": self.ndim}, f)
+        elif vectors.shape[1] != self.ndim:
+            raise ValueError(f"expected {self.ndim}-dimensional vectors, got {vectors.shape[1]}")
+        keys = _key_array(keys)
+        # first occurrence of every key that is not cached yet, in input order
+        distinct, first = np.unique(keys, return_index=True)
+        new = np.sort(first[self._find(distinct) < 0])
+        if not len(new):
+            return
+        with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+            # drop vectors without keys left behind by an interrupted `add`
+            f.truncate(self.num_rows * 4 * self.ndim)
+            f.seek(0, os.SEEK_END)
+            vectors[new].tofile(f)
+        with open(self.keys_path, "r+b" if os.path.exists(self.keys_path) else "wb") as f:
+            f.truncate(self.num_rows * DIGEST_SIZE)
+            f.seek(0, os.SEEK_END)
+            f.write(keys[new].tobytes())
+        rows = np.arange(self.num_rows, self.num_rows + len(new))
+        self.num_rows += len(new)
+        self._merge(keys[new], rows)
+        self._map()
+
+
+def embed_with_cache(
+    texts: Sequence[str], cache: EmbeddingCache, embed_fn: Callable[[list[str]], np.ndarray]
+) -> np.ndarray:
+    """
+    Embeds only the texts missing from `cache`, each distinct text once,
+    stores them and returns all vectors in input order.
+    """
+    keys = [content_key(text) for text in texts]
+    rows, found = cache.lookup(keys)
+    num_cached = int(found.sum())
+    missing = {}
+    for i in np.flatnonzero(~found):
+        missing.setdefault(keys[i], i)
+    if missing:
+        new_vectors = embed_fn([texts[i] for i in missing.values()])
+        cache.add(list(missing), new_vectors)
+        rows, found = cache.lookup(keys)
+    print(f"embedding cache: {num_cached} of {len(texts)} texts cached")
+    if not len(texts):
+        return np.empty((0, cache.ndim or 0), dtype=np.float32)
+    return np.asarray(cache.vectors[rows])
@@ -1,10 +1,14 @@
 import requests
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
-from usearch.io import save_matrix
 from datasets import load_dataset
 
+from batching import estimate_tokens, token_budget_batches
+from cache import EmbeddingCache, embed_with_cache
+from matrix_io import MatrixWriter
+
 def get_dataset():
     dataset = load_dataset("unum-cloud/ann-codesearch-4m")
     train_set = dataset["train"]
@@ -12,18 +16,59 @@ def get_dataset():
     test_set = dataset["test"]
     return train_set, validation_set, test_set
 
-def get_embedding_vecs(dataset):
-    embs = dataset.map(truncate, num_proc=16).map(query_embs,  batched=True, batch_size=32, num_proc=16)
-    code_vecs = embs["embed_func_code"]
-    docs_vecs = embs["embed_func_doc"]
-    return np.array(code_vecs), np.array(docs_vecs)
+def get_embedding_vecs(dataset, max_tokens: int = 16384, max_batch_size: int = 64, num_threads: int = 16, cache: EmbeddingCache = None):
+    """
+    Embeds code and docs over HTTP in length-sorted batches under a padded-token budget,
+    see `batching.py`, and returns the vectors in dataset order.
+    With a `cache`, only texts not embedded by a previous run are sent.
+    """
+    max_len = 8192
+    codes = [text[:max_len] for text in dataset["func_code_string"]]
+    docs = [text[:max_len] for text in dataset["func_documentation_string"]]
+    embed_fn = lambda texts: embed_in_batches(texts, max_tokens, max_batch_size, num_threads)
+    if cache is not None:
+        return embed_with_cache(codes, cache, embed_fn), embed_with_cache(docs, cache, embed_fn)
+    return embed_fn(codes), embed_fn(docs)
+
+def embed_in_batches(texts: list[str], max_tokens: int, max_batch_size: int, num_threads: int) -> np.ndarray:
+    batches = token_budget_batches(estimate_tokens(texts), max_tokens, max_batch_size)
+    with ThreadPoolExecutor(num_threads) as pool:
+        results = pool.map(lambda batch: embed([texts[i] for i in batch]), batches)
+        vecs = None
+        for batch, embs in zip(batches, results):
+            embs = np.asarray(embs, dtype=np.float32)
+            if vecs is None:
+                vecs = np.empty((len(texts), embs.shape[-1]), dtype=np.float32)
+            # scatter back, so the output follows the input order
+            vecs[batch] = embs
+    return vecs
+
+def get_embedding_vecs_local(dataset, embedder, cache: EmbeddingCache = None):
+    """Embeds code and docs with an in-process `local_embed.LocalEmbedder` instead of the HTTP endpoint."""
+    max_len = 8192
+    codes = [text[:max_len] for text in dataset["func_code_string"]]
+    docs = [text[:max_len] for text in dataset["func_documentation_string"]]
+    # one pass over both columns, the embedder keeps its engine started across chunks
+    embed_fn = embedder.embed
+    vecs = embed_with_cache(codes + docs, cache, embed_fn) if cache is not None else embed_fn(codes + docs)
+    return vecs[:len(codes)], vecs[len(codes):]
 
-def truncate(row: dict, max_len: int = 8192) -> dict:
-    row["func_code_string"] = row["func_code_string"][:max_len]
-    row["func_documentation_string"] = row["func_documentation_string"][:max_len]
-    return row
+def write_embedding_vecs(dataset, code_path: str, docs_path: str, embed_fn=get_embedding_vecs, chunk_rows: int = 65536, **kwargs) -> int:
+    """
+    Embeds the dataset `chunk_rows` rows at a time with `embed_fn` and appends each chunk
+    to the `.fbin`/`.hbin` files, so only one chunk of vectors is held in memory.
+    """
+    with MatrixWriter(code_path) as code_writer, MatrixWriter(docs_path) as docs_writer:
+        for start in range(0, len(dataset), chunk_rows):
+            # slicing a `datasets.Dataset` returns a dict of columns, which `embed_fn` accepts
+            code_vecs, docs_vecs = embed_fn(dataset[start:start + chunk_rows], **kwargs)
+            code_writer.write(code_vecs)
+            docs_writer.write(docs_vecs)
+            print(f"embedded {code_writer.num_rows} of {len(dataset)} rows")
+    return code_writer.num_rows
 
 def embed(text: list[str]) -> list[np.array]:
+    error = None
     for _ in range(5):
         try:
             api_url = "https://cvllama3hackathon-infinity.hf.space/embeddings"
@@ -31,22 +76,34 @@ def embed(text: list[str]) -> list[np.array]:
             embs = [emb["embedding"] for emb in response.json()["data"]]
             return embs
         except Exception as e:
+            error = e
             continue
+    # fail loudly instead of storing `None` rows
+    raise RuntimeError(f"embedding {len(text)} texts failed after 5 attempts") from error
 
 
-def query_embs(list_rows: list[dict]):
-    list_rows["embed_func_code"] = embed(list_rows["func_code_string"])
-    list_rows["embed_func_doc"] = embed(list_rows["func_documentation_string"])
-    return list_rows
-
 if __name__ == "__main__":
     OUT_PATH = "/home/michael/MongooseMiner/data/"
+    # set to a model name or local directory to embed in-process on CPU instead of over HTTP
+    LOCAL_MODEL = None
+    # vectors are cached per model by content hash, a re-run only embeds new or changed texts
+    CACHE_DIR = Path(OUT_PATH).joinpath("embedding_cache").as_posix()
+    cache = EmbeddingCache(CACHE_DIR, LOCAL_MODEL or "code-embed")
+    embedder = None
+    if LOCAL_MODEL:
+        from local_embed import LocalEmbedder, make_engine
+
+        # loaded once for all splits and chunks
+        embedder = LocalEmbedder(make_engine(LOCAL_MODEL))
     datasets = get_dataset()
     for dataset in datasets:
         if dataset.split._name == "test":
-            code_vecs, docs_vecs = get_embedding_vecs(dataset)
             code_path = Path(OUT_PATH).joinpath(dataset.split._name + "_code.fbin").as_posix()
             docs_path = Path(OUT_PATH).joinpath(dataset.split._name + "_docs.fbin").as_posix()
-            save_matrix(code_vecs, code_path)
-            save_matrix(docs_vecs, docs_path)
+            if embedder is not None:
+                write_embedding_vecs(dataset, code_path, docs_path, get_embedding_vecs_local, embedder=embedder, cache=cache)
+            else:
+                write_embedding_vecs(dataset, code_path, docs_path, cache=cache)
+    if embedder is not None:
+        embedder.close()
     print("Done!")
\ No newline at end of file
@@ -1,4 +1,4 @@
-from usearch.io import load_matrix
+from matrix_io import open_matrix
 from usearch.index import Index
 import numpy as np
 
@@ -15,8 +15,8 @@ def eval_similarity(x, y):
 if __name__ == "__main__":
     CODE_PATH = "/home/michael/MongooseMiner/data/test_code.fbin"
     DOCS_PATH = "/home/michael/MongooseMiner/data/test_docs.fbin"
-    code_embs = load_matrix(CODE_PATH)
-    doc_embs = load_matrix(DOCS_PATH)
+    code_embs = open_matrix(CODE_PATH)
+    doc_embs = open_matrix(DOCS_PATH)
     print("Code <-> Doc")
     eval_similarity(code_embs, doc_embs)
     print("Doc <-> Code")
@@ -0,0 +1,135 @@
+"""Local batched embedding stage on the in-process `infinity_emb` engine used by the demo."""
+
+import asyncio
+from typing import Callable, Optional
+
+import numpy as np
+from infinity_emb import AsyncEmbeddingEngine, EngineArgs
+
+from batching import count_tokens, token_budget_batches
+
+DEFAULT_MODEL = "michaelfeil/jina-embeddings-v2-base-code"
+
+
+class EmbeddingError(RuntimeError):
+    pass
+
+
+def make_engine(
+    model_name_or_path: str = DEFAULT_MODEL, device: str = "cpu", batch_size: int = 256
+) -> AsyncEmbeddingEngine:
+    # a local directory works offline, e.g. a small model saved with `save_pretrained`;
+    # `batch_size` should be at least `max_batch_size` of the token budget batches,
+    # otherwise the engine splits them again
+    return AsyncEmbeddingEngine.from_args(
+        EngineArgs(
+            model_name_or_path=model_name_or_path,
+            device=device,
+            batch_size=batch_size,
+        )
+    )
+
+
+async def embed_batches(
+    engine: AsyncEmbeddingEngine,
+    texts: list[str],
+    batches: list[np.ndarray],
+    num_consumers: int = 4,
+    queue_size: int = 16,
+) -> np.ndarray:
+    """Embeds `texts` batch by batch with the started `engine`, returns the vectors in the original order."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    vectors: Optional[np.ndarray] = None
+
+    async def produce() -> None:
+        for batch in batches:
+            await queue.put(batch)
+        for _ in range(num_consumers):
+            await queue.put(None)
+
+    async def consume() -> None:
+        nonlocal vectors
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                return
+            try:
+                embeddings, _ = await engine.embed(sentences=[texts[i] for i in batch])
+            except Exception as e:
+                raise EmbeddingError(
+                    f"embedding a batch of {len(batch)} texts starting at row {batch[0]} failed"
+                ) from e
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            if vectors is None:
+                vectors = np.empty((len(texts), embeddings.shape[-1]), dtype=np.float32)
+            vectors[batch] = embeddings
+
+    tasks = [asyncio.create_task(produce())] + [
+        asyncio.create_task(consume()) for _ in range(num_consumers)
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # one failed batch fails the stage, do not leave the others running
+        for task in tasks:
+            task.cancel()
+        raise
+    if vectors is None:
+        return np.empty((0, 0), dtype=np.float32)
+    return vectors
+
+
+class LocalEmbedder:
+    """Keeps one started engine and event loop for a whole run, the model is loaded once."""
+
+    def __init__(
+        self,
+        engine: AsyncEmbeddingEngine,
+        max_tokens: int = 16384,
+        max_batch_size: int = 256,
+        num_consumers: int = 4,
+        queue_size: int = 16,
+        tokenizer: Optional[Callable] = None,
+    ) -> None:
+        self.engine = engine
+        self.max_tokens = max_tokens
+        self.max_batch_size = max_batch_size
+        self.num_consumers = num_consumers
+        self.queue_size = queue_size
+        self.tokenizer = tokenizer
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self.engine.astart())
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        batches = token_budget_batches(
+            count_tokens(texts, self.tokenizer), self.max_tokens, self.max_batch_size
+        )
+        return self.loop.run_until_complete(
+            embed_batches(self.engine, texts, batches, self.num_consumers, self.queue_size)
+        )
+
+    def close(self) -> None:
+        if self.loop.is_closed():
+            return
+        self.loop.run_until_complete(self.engine.astop())
+        self.loop.close()
+
+    def __enter__(self) -> "LocalEmbedder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def embed_local(
+    texts: list[str],
+    engine: AsyncEmbeddingEngine,
+    max_tokens: int = 16384,
+    max_batch_size: int = 256,
+    num_consumers: int = 4,
+    queue_size: int = 16,
+    tokenizer: Optional[Callable] = None,
+) -> np.ndarray:
+    """one-off embedding, starts and stops `engine`; use `LocalEmbedder` for repeated calls"""
+    with LocalEmbedder(engine, max_tokens, max_batch_size, num_consumers, queue_size, tokenizer) as embedder:
+        return embedder.embed(texts)
@@ -0,0 +1,79 @@
+"""Streaming writer and memory-mapped reader for the `usearch.io` matrix files."""
+
+import os
+import struct
+from typing import Optional
+
+import numpy as np
+
+_DTYPES = {
+    ".fbin": np.float32,
+    ".f32bin": np.float32,
+    ".hbin": np.float16,
+    ".dbin": np.float64,
+    ".ibin": np.int32,
+    ".i32bin": np.int32,
+    ".bbin": np.uint8,
+    ".i8bin": np.int8,
+}
+_HEADER = struct.Struct("<ii")
+
+
+def dtype_for(path: str) -> type:
+    dtype = _DTYPES.get(os.path.splitext(path)[1])
+    if dtype is None:
+        raise ValueError(f"unknown matrix file type: {path}")
+    return dtype
+
+
+class MatrixWriter:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.dtype = dtype_for(path)
+        self.num_rows = 0
+        self.ndim: Optional[int] = None
+        # rows go to `.tmp` and replace `path` on a successful `close`, readers never see a half-written file
+        self._file = open(path + ".tmp", "wb")
+        self._file.write(_HEADER.pack(0, 0))
+
+    def write(self, vectors: np.ndarray) -> None:
+        vectors = np.asarray(vectors)
+        if vectors.ndim != 2:
+            raise ValueError(f"expected a 2-dimensional batch, got shape {vectors.shape}")
+        if self.ndim is None:
+            self.ndim = vectors.shape[1]
+        elif vectors.shape[1] != self.ndim:
+            raise ValueError(f"expected {self.ndim} columns, got {vectors.shape[1]}")
+        np.ascontiguousarray(vectors, dtype=self.dtype).tofile(self._file)
+        self.num_rows += len(vectors)
+
+    def close(self, success: bool = True) -> None:
+        if self._file.closed:
+            return
+        if success:
+            self._file.seek(0)
+            self._file.write(_HEADER.pack(self.num_rows, self.ndim or 0))
+        self._file.close()
+        if success:
+            os.replace(self.path + ".tmp", self.path)
+        else:
+            os.remove(self.path + ".tmp")
+
+    def __enter__(self) -> "MatrixWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close(success=exc_type is None)
+
+
+def open_matrix(path: str, mode: str = "r") -> np.memmap:
+    """Memory-maps a matrix file, rows are only read from disk when accessed."""
+    with open(path, "rb") as f:
+        num_rows, ndim = _HEADER.unpack(f.read(_HEADER.size))
+    dtype = dtype_for(path)
+    expected = _HEADER.size + num_rows * ndim * np.dtype(dtype).itemsize
+    if os.path.getsize(path) != expected:
+        raise ValueError(f"{path} holds {os.path.getsize(path)} bytes, the header promises {expected}")
+    if num_rows == 0:
+        return np.empty((0, ndim), dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, offset=_HEADER.size, shape=(num_rows, ndim))
@@ -0,0 +1,163 @@
+"""Compacts the per-package outputs into one hash-bucketed, sorted Parquet corpus."""
+
+import argparse
+import glob
+import json
+import os
+import zlib
+from collections import defaultdict
+from typing import Iterator, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from sink import COMPRESSION, DICTIONARY_COLUMNS, SCHEMA
+
+CORPUS_INFO = "_corpus.json"
+
+
+def top_level_module(package: str) -> str:
+    return package.split(".", 1)[0]
+
+
+def bucket_of(package: str, num_buckets: int) -> int:
+    # crc32 instead of `hash()`, which is salted per interpreter
+    return zlib.crc32(top_level_module(package).encode()) % num_buckets
+
+
+def _bucket_dir(out_dir: str, bucket: int) -> str:
+    return os.path.join(out_dir, f"bucket={bucket:04d}")
+
+
+def _bucket_column(table: pa.Table, num_buckets: int) -> pa.Array:
+    # hash the distinct top-level modules once, not every row
+    packages = table.column("package").combine_chunks().dictionary_encode()
+    buckets = [
+        bucket_of(package, num_buckets) if package is not None else 0
+        for package in packages.dictionary.to_pylist()
+    ]
+    return pc.take(pa.array(buckets, pa.int32()), packages.indices)
+
+
+def compact(
+    in_dir: str, out_dir: str, num_buckets: int = 256, row_group_size: int = 65536
+) -> None:
+    """
+    merges all `{package}.parquet` files of a mining run into `out_dir`
+    memory is bounded by the size of one bucket
+    """
+    paths = sorted(glob.glob(os.path.join(in_dir, "*.parquet")))
+
+    # first pass: only read the dictionary-encoded `package` column to plan the buckets
+    files_per_bucket = defaultdict(list)
+    for path in paths:
+        packages = pq.read_table(path, columns=["package"]).column("package")
+        for package in pc.unique(packages).to_pylist():
+            if package is not None:
+                files_per_bucket[bucket_of(package, num_buckets)].append(path)
+
+    os.makedirs(out_dir, exist_ok=True)
+    for bucket, bucket_paths in sorted(files_per_bucket.items()):
+        tables = []
+        for path in sorted(set(bucket_paths)):
+            # `cast` normalizes files written before the schema was fixed, e.g. by pandas
+            table = pq.read_table(path)
+            for field in SCHEMA:
+                if field.name not in table.column_names:
+                    # e.g. `qualname`, which older exports do not have
+                    table = table.append_column(field, pa.nulls(table.num_rows, field.type))
+            table = table.select(SCHEMA.names).cast(SCHEMA)
+            tables.append(table.filter(pc.equal(_bucket_column(table, num_buckets), bucket)))
+        table = pa.concat_tables(tables).sort_by([("package", "ascending"), ("name", "ascending")])
+
+        os.makedirs(_bucket_dir(out_dir, bucket), exist_ok=True)
+        pq.write_table(
+            table,
+            os.path.join(_bucket_dir(out_dir, bucket), "part-0.parquet"),
+            row_group_size=row_group_size,
+            use_dictionary=DICTIONARY_COLUMNS,
+            compression=COMPRESSION,
+            write_statistics=True,
+        )
+        print(f"bucket {bucket}: {table.num_rows} rows from {len(set(bucket_paths))} files")
+
+    with open(os.path.join(out_dir, CORPUS_INFO), "w") as f:
+        json.dump({"num_buckets": num_buckets, "columns": SCHEMA.names}, f)
+
+
+def _corpus_filter(
+    packages: Optional[Sequence[str]], names: Optional[Sequence[str]], num_buckets: int
+) -> Optional[ds.Expression]:
+    expression = None
+    if packages:
+        # `numpy` matches `numpy` and `numpy.*`: module names only contain identifier
+        # characters and dots, which all sort after "/" except the dot itself
+        package_filters = [
+            (ds.field("package") >= package) & (ds.field("package") < package + "/")
+            for package in packages
+        ]
+        buckets = sorted({bucket_of(package, num_buckets) for package in packages})
+        expression = ds.field("bucket").isin(buckets)
+        any_package = package_filters[0]
+        for package_filter in package_filters[1:]:
+            any_package = any_package | package_filter
+        expression = expression & any_package
+    if names:
+        name_filter = ds.field("name").isin(list(names))
+        expression = name_filter if expression is None else expression & name_filter
+    return expression
+
+
+def open_corpus(path: str) -> tuple[ds.Dataset, int]:
+    with open(os.path.join(path, CORPUS_INFO)) as f:
+        num_buckets = json.load(f)["num_buckets"]
+    dataset = ds.dataset(
+        path,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("bucket", pa.int32())]), flavor="hive"),
+        exclude_invalid_files=False,
+    )
+    return dataset, num_buckets
+
+
+def iter_corpus(
+    path: str,
+    packages: Optional[Sequence[str]] = None,
+    names: Optional[Sequence[str]] = None,
+    columns: Optional[Sequence[str]] = None,
+    batch_size: int = 65536,
+) -> Iterator[pa.RecordBatch]:
+    """Streams the corpus, pushing `packages`/`names` filters down to buckets and row groups."""
+    dataset, num_buckets = open_corpus(path)
+    yield from dataset.to_batches(
+        columns=list(columns or SCHEMA.names),
+        filter=_corpus_filter(packages, names, num_buckets),
+        batch_size=batch_size,
+    )
+
+
+def read_corpus(
+    path: str,
+    packages: Optional[Sequence[str]] = None,
+    names: Optional[Sequence[str]] = None,
+    columns: Optional[Sequence[str]] = None,
+) -> pa.Table:
+    dataset, num_buckets = open_corpus(path)
+    return dataset.to_table(
+        columns=list(columns or SCHEMA.names),
+        filter=_corpus_filter(packages, names, num_buckets),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Merge per-package parquet files into a partitioned corpus"
+    )
+    parser.add_argument("--s3_bucket", type=str, help="Directory with the mined {package}.parquet files", default="")
+    parser.add_argument("--out", type=str, help="Output directory of the corpus", default="corpus")
+    parser.add_argument("--buckets", type=int, help="Number of hash buckets", default=256)
+    parser.add_argument("--row_group_size", type=int, help="Rows per row group", default=65536)
+    args = parser.parse_args()
+    compact(args.s3_bucket, args.out, args.buckets, args.row_group_size)
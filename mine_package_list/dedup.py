@@ -0,0 +1,145 @@
+"""Drops exact duplicates by normalized content hash, recording the dropped locations as aliases."""
+
+import argparse
+import hashlib
+import inspect
+import re
+from typing import Iterable, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from corpus import iter_corpus
+from sink import COMPRESSION, DICTIONARY_COLUMNS, SCHEMA
+
+_WHITESPACE = re.compile(r"\s+")
+
+DEDUP_SCHEMA = SCHEMA.append(pa.field("content_hash", pa.string())).append(
+    pa.field("aliases", pa.list_(pa.string()))
+)
+# per leaf column, the strings of a list column are `<name>.list.element`
+DEDUP_COMPRESSION = {**COMPRESSION, "content_hash": "snappy", "aliases.list.element": "snappy"}
+
+
+def normalize_code(code: Optional[str]) -> str:
+    # indentation is significant, trailing whitespace and blank lines are not
+    if not code:
+        return ""
+    lines = (line.rstrip() for line in code.strip("\n").splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def normalize_text(text: Optional[str]) -> str:
+    if not text:
+        return ""
+    return _WHITESPACE.sub(" ", inspect.cleandoc(text)).strip()
+
+
+def content_hash(code: Optional[str], docstring: Optional[str], signature: Optional[str]) -> str:
+    key = "\x1f".join(
+        (normalize_code(code), normalize_text(docstring), normalize_text(signature))
+    )
+    return hashlib.blake2b(key.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def _batch_hashes(batch: pa.RecordBatch) -> pa.Array:
+    return pa.array(
+        [
+            content_hash(code, docstring, signature)
+            for code, docstring, signature in zip(
+                batch.column("code").to_pylist(),
+                batch.column("docstring").to_pylist(),
+                batch.column("signature").to_pylist(),
+            )
+        ],
+        pa.string(),
+    )
+
+
+def _locations(batch: pa.RecordBatch) -> pa.Array:
+    return pc.binary_join_element_wise(batch.column("package"), batch.column("name"), ".")
+
+
+def plan_dedup(batches: Iterable[pa.RecordBatch]) -> tuple[pa.Table, dict[int, list[str]]]:
+    """
+    first pass: hashes every row
+    returns the hash per row and, for each kept row id, the locations of its duplicates
+    """
+    hashes, locations, depths = [], [], []
+    for batch in batches:
+        hashes.append(_batch_hashes(batch))
+        locations.append(_locations(batch))
+        depths.append(pc.utf8_length(batch.column("package")))
+    num_rows = sum(len(h) for h in hashes)
+    plan = pa.table(
+        {
+            "content_hash": pa.concat_arrays(hashes) if hashes else pa.array([], pa.string()),
+            "location": pa.concat_arrays(locations) if locations else pa.array([], pa.string()),
+            "depth": pa.concat_arrays(depths) if depths else pa.array([], pa.int32()),
+            "row_id": pa.array(range(num_rows), pa.int64()),
+        }
+    )
+
+    # the row with the shortest module path is the canonical one, e.g. `six` over `foo._vendor.six`
+    plan = plan.sort_by([("content_hash", "ascending"), ("depth", "ascending"), ("row_id", "ascending")])
+    groups = plan.group_by("content_hash", use_threads=False).aggregate(
+        [("row_id", "first"), ("location", "list"), ("row_id", "count")]
+    )
+
+    aliases = {}
+    duplicated = groups.filter(pc.greater(groups.column("row_id_count"), 1))
+    for row_id, group_locations in zip(
+        duplicated.column("row_id_first").to_pylist(),
+        duplicated.column("location_list").to_pylist(),
+    ):
+        aliases[row_id] = group_locations[1:]
+    keep = pa.table(
+        {
+            "row_id": groups.column("row_id_first"),
+            "content_hash": groups.column("content_hash"),
+        }
+    )
+    return keep, aliases
+
+
+def dedup_corpus(corpus_path: str, out_path: str, row_group_size: int = 65536) -> None:
+    keep, aliases = plan_dedup(iter_corpus(corpus_path, columns=SCHEMA.names))
+    keep = keep.sort_by("row_id")
+    kept_ids = keep.column("row_id").to_numpy()
+    kept_hashes = keep.column("content_hash").to_pylist()
+
+    # second pass: stream the corpus again in the same order and keep canonical rows only
+    writer = pq.ParquetWriter(
+        out_path, DEDUP_SCHEMA, use_dictionary=DICTIONARY_COLUMNS, compression=DEDUP_COMPRESSION
+    )
+    offset, cursor, total = 0, 0, 0
+    for batch in iter_corpus(corpus_path, columns=SCHEMA.names):
+        end = offset + batch.num_rows
+        start_cursor = cursor
+        while cursor < len(kept_ids) and kept_ids[cursor] < end:
+            cursor += 1
+        row_ids = kept_ids[start_cursor:cursor]
+        total += batch.num_rows
+        if len(row_ids):
+            kept = batch.take(pa.array(row_ids - offset))
+            columns = kept.columns + [
+                pa.array(kept_hashes[start_cursor:cursor], pa.string()),
+                pa.array([aliases.get(int(i), []) for i in row_ids], pa.list_(pa.string())),
+            ]
+            writer.write_batch(
+                pa.record_batch(columns, schema=DEDUP_SCHEMA), row_group_size=row_group_size
+            )
+        offset = end
+    writer.close()
+    print(f"kept {len(kept_ids)} of {total} rows ({total - len(kept_ids)} duplicates)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Drop exact duplicate functions from the mined corpus before embedding"
+    )
+    parser.add_argument("--corpus", type=str, help="Corpus directory written by corpus.py", default="corpus")
+    parser.add_argument("--out", type=str, help="Output parquet file", default="corpus_dedup.parquet")
+    args = parser.parse_args()
+    dedup_corpus(args.corpus, args.out)
@@ -0,0 +1,289 @@
+"""Mines many packages with a pool of recycled, time- and memory-limited worker processes."""
+
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import resource
+import signal
+import time
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+from ledger import (
+    STATUS_FAILED,
+    STATUS_OK,
+    STATUS_SKIPPED,
+    STATUS_TIMEOUT,
+    JobLedger,
+    print_stats,
+)
+from parse import package_to_s3parquet
+from versions import is_up_to_date, load_pypi_versions, normalize_name
+
+
+@dataclass
+class MineResult:
+    # name of the pip package
+    package: str
+    # one of the `ledger.STATUS_*` values
+    status: str
+    # wall time spent on the package in seconds
+    duration: float
+    # number of mined entries, 0 unless status is "ok"
+    num_entries: int = 0
+    # exception class name if the package failed
+    error: Optional[str] = None
+
+
+def _limit_memory(max_memory_mb: Optional[int]) -> None:
+    if max_memory_mb:
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def mine_package(
+    package_name: str, out_dir: str, static: bool = False, version: Optional[str] = None
+) -> MineResult:
+    start = time.monotonic()
+    try:
+        num_entries = package_to_s3parquet(
+            package_name, out_dir, static=static, version=version
+        )
+    except BaseException as e:
+        # includes `SystemExit` from packages that call `sys.exit()` at import time
+        # `MiningError` carries the exception class name raised in the mining subprocess
+        return MineResult(
+            package_name,
+            STATUS_FAILED,
+            time.monotonic() - start,
+            error=getattr(e, "error", type(e).__name__),
+        )
+    return MineResult(package_name, STATUS_OK, time.monotonic() - start, num_entries)
+
+
+def _worker_loop(
+    slot: int,
+    tasks: mp.Queue,
+    results: mp.Queue,
+    out_dir: str,
+    static: bool,
+    max_memory_mb: Optional[int],
+) -> None:
+    # own process group, so a kill also reaches the mining subprocesses
+    os.setpgrp()
+    _limit_memory(max_memory_mb)
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        package_name, version = task
+        results.put((slot, mine_package(package_name, out_dir, static, version)))
+
+
+class _Worker:
+    def __init__(self, ctx, slot: int, results: mp.Queue, args: tuple) -> None:
+        self.tasks = ctx.Queue()
+        self.process = ctx.Process(
+            target=_worker_loop,
+            args=(slot, self.tasks, results) + args,
+            daemon=True,
+        )
+        self.process.start()
+        self.num_tasks = 0
+        self.package: Optional[str] = None
+        self.started_at = 0.0
+
+    def submit(self, package_name: str, version: Optional[str]) -> None:
+        self.package = package_name
+        self.started_at = time.monotonic()
+        self.num_tasks += 1
+        self.tasks.put((package_name, version))
+
+    def stop(self) -> None:
+        self.tasks.put(None)
+        self.process.join(timeout=5)
+        self.kill()
+
+    def kill(self) -> None:
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.join()
+
+
+def mine_packages(
+    packages: Iterable[str],
+    out_dir: str,
+    num_workers: int = 64,
+    timeout: float = 240,
+    max_memory_mb: Optional[int] = 8192,
+    tasks_per_worker: int = 16,
+    static: bool = False,
+    versions: Optional[dict[str, str]] = None,
+) -> Iterator[MineResult]:
+    """
+    mines all packages with `num_workers` worker processes
+    yields one `MineResult` per package in completion order
+
+    `versions` maps normalized package names to the `pypi_version` to mine
+    """
+    versions = versions or {}
+    ctx = mp.get_context("fork")
+    results = ctx.Queue()
+    worker_args = (out_dir, static, max_memory_mb)
+    workers = [_Worker(ctx, slot, results, worker_args) for slot in range(num_workers)]
+    pending = iter(packages)
+    exhausted = False
+
+    def replace(slot: int) -> None:
+        workers[slot] = _Worker(ctx, slot, results, worker_args)
+
+    def fill(slot: int) -> None:
+        nonlocal exhausted
+        if exhausted:
+            return
+        package_name = next(pending, None)
+        if package_name is None:
+            exhausted = True
+            return
+        workers[slot].submit(package_name, versions.get(normalize_name(package_name)))
+
+    try:
+        for slot in range(num_workers):
+            fill(slot)
+
+        while any(worker.package is not None for worker in workers):
+            try:
+                slot, result = results.get(timeout=1.0)
+            except queue.Empty:
+                pass
+            else:
+                worker = workers[slot]
+                if worker.package != result.package:
+                    # late result of a worker that was already killed and replaced
+                    continue
+                worker.package = None
+                yield result
+                if worker.num_tasks >= tasks_per_worker:
+                    # recycle to release the memory the worker piled up
+                    worker.stop()
+                    replace(slot)
+                fill(slot)
+
+            now = time.monotonic()
+            for slot, worker in enumerate(workers):
+                if worker.package is None:
+                    continue
+                if now - worker.started_at > timeout:
+                    status, error = STATUS_TIMEOUT, None
+                elif not worker.process.is_alive():
+                    # killed by the OOM killer, segfaults in C extensions, ...
+                    status, error = STATUS_FAILED, "WorkerDied"
+                else:
+                    continue
+                worker.kill()
+                yield MineResult(
+                    worker.package, status, now - worker.started_at, error=error
+                )
+                replace(slot)
+                fill(slot)
+    finally:
+        for worker in workers:
+            worker.kill()
+
+
+def read_package_list(path: str) -> list[str]:
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def record_result(ledger: JobLedger, result: MineResult) -> None:
+    ledger.record(
+        result.package, result.status, result.duration, result.num_entries, result.error
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Mine docstrings and code of many packages with a worker pool"
+    )
+    parser.add_argument(
+        "--packages",
+        type=str,
+        help="File with one package name per line",
+        default="scrape_packages.txt",
+    )
+    parser.add_argument(
+        "--s3_bucket", type=str, help="Output bucket / base in s3", default=""
+    )
+    parser.add_argument("--workers", type=int, help="Number of worker processes", default=64)
+    parser.add_argument(
+        "--timeout", type=float, help="Seconds per package before the worker is killed", default=240
+    )
+    parser.add_argument(
+        "--max_memory_mb", type=int, help="Address space limit per worker", default=8192
+    )
+    parser.add_argument(
+        "--tasks_per_worker", type=int, help="Packages before a worker is restarted", default=16
+    )
+    parser.add_argument(
+        "--static",
+        action="store_true",
+        help="Parse the downloaded sdist/wheel with `ast` instead of installing and importing it",
+    )
+    parser.add_argument(
+        "--ledger", type=str, help="SQLite job ledger to resume from", default="ledger.sqlite"
+    )
+    parser.add_argument(
+        "--skip_failed",
+        action="store_true",
+        help="Also skip packages that failed or timed out in a previous run",
+    )
+    parser.add_argument(
+        "--versions",
+        type=str,
+        help="BigQuery export with `pypi_name`/`pypi_version`; only re-mine packages whose version changed",
+        default="",
+    )
+    args = parser.parse_args()
+
+    ledger = JobLedger(args.ledger)
+    packages = read_package_list(args.packages)
+    versions = None
+    if args.versions:
+        # a refresh: the manifests next to the parquet files decide what is up to date,
+        # so the same ledger can be reused across refreshes
+        versions = load_pypi_versions(args.versions)
+        done = {
+            p
+            for p in packages
+            if is_up_to_date(args.s3_bucket, p, versions.get(normalize_name(p)))
+        }
+        for p in done:
+            ledger.record(p, STATUS_SKIPPED, 0.0)
+    else:
+        done = ledger.completed()
+    if args.skip_failed:
+        done |= ledger.packages_with_status([STATUS_FAILED, STATUS_TIMEOUT])
+    packages = [p for p in packages if p not in done]
+    print(f"{len(done)} packages already done, {len(packages)} to mine")
+
+    for result in mine_packages(
+        packages,
+        args.s3_bucket,
+        num_workers=args.workers,
+        timeout=args.timeout,
+        max_memory_mb=args.max_memory_mb,
+        tasks_per_worker=args.tasks_per_worker,
+        static=args.static,
+        versions=versions,
+    ):
+        print(
+            f"{result.status:>7} {result.package} "
+            f"({result.num_entries} entries, {result.duration:.1f}s)"
+            + (f" {result.error}" if result.error else "")
+        )
+        record_result(ledger, result)
+    print_stats(ledger.stats())
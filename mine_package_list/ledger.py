@@ -0,0 +1,128 @@
+"""SQLite ledger of mining outcomes, so interrupted runs resume where they stopped."""
+
+import argparse
+import sqlite3
+import time
+from typing import Iterable, Optional
+
+# package was mined and exported
+STATUS_OK = "ok"
+# mining raised an exception or the worker died
+STATUS_FAILED = "failed"
+# mining exceeded the per-package timeout
+STATUS_TIMEOUT = "timeout"
+# package was intentionally not mined, e.g. because it is up to date
+STATUS_SKIPPED = "skipped"
+
+COMPLETED_STATUSES = (STATUS_OK, STATUS_SKIPPED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    package TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    duration REAL NOT NULL,
+    num_entries INTEGER NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL,
+    finished_at REAL NOT NULL
+)
+"""
+
+
+class JobLedger:
+    def __init__(self, path: str) -> None:
+        # the driver records all results from its main process, so one connection is enough
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(_SCHEMA)
+        self.connection.commit()
+
+    def record(
+        self,
+        package: str,
+        status: str,
+        duration: float,
+        num_entries: int = 0,
+        error: Optional[str] = None,
+    ) -> None:
+        # keep the latest outcome per package and count how often it was tried
+        self.connection.execute(
+            """
+            INSERT INTO jobs (package, status, duration, num_entries, error, attempts, finished_at)
+            VALUES (?, ?, ?, ?, ?, 1, ?)
+            ON CONFLICT(package) DO UPDATE SET
+                status = excluded.status,
+                duration = excluded.duration,
+                num_entries = excluded.num_entries,
+                error = excluded.error,
+                attempts = jobs.attempts + 1,
+                finished_at = excluded.finished_at
+            """,
+            (package, status, duration, num_entries, error, time.time()),
+        )
+        self.connection.commit()
+
+    def packages_with_status(self, statuses: Iterable[str]) -> set[str]:
+        statuses = tuple(statuses)
+        placeholders = ", ".join("?" * len(statuses))
+        rows = self.connection.execute(
+            f"SELECT package FROM jobs WHERE status IN ({placeholders})", statuses
+        )
+        return {package for (package,) in rows}
+
+    def completed(self) -> set[str]:
+        return self.packages_with_status(COMPLETED_STATUSES)
+
+    def stats(self) -> dict:
+        """Counts per status and the throughput over the recorded wall time."""
+        counts = dict(
+            self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        )
+        total, entries, busy_time, first_start, last_finish = self.connection.execute(
+            """
+            SELECT COUNT(*), COALESCE(SUM(num_entries), 0), COALESCE(SUM(duration), 0),
+                   MIN(finished_at - duration), MAX(finished_at)
+            FROM jobs
+            """
+        ).fetchone()
+        wall_time = (last_finish - first_start) if total else 0.0
+        errors = dict(
+            self.connection.execute(
+                """
+                SELECT error, COUNT(*) FROM jobs WHERE error IS NOT NULL
+                GROUP BY error ORDER BY COUNT(*) DESC LIMIT 10
+                """
+            )
+        )
+        return {
+            "packages": total,
+            "statuses": counts,
+            "entries": entries,
+            "wall_time_s": wall_time,
+            "mean_duration_s": busy_time / total if total else 0.0,
+            "packages_per_hour": total / wall_time * 3600 if wall_time else 0.0,
+            "entries_per_second": entries / wall_time if wall_time else 0.0,
+            "top_errors": errors,
+        }
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def print_stats(stats: dict) -> None:
+    print(f"packages: {stats['packages']} {stats['statuses']}")
+    print(f"entries: {stats['entries']}")
+    print(
+        f"throughput: {stats['packages_per_hour']:.0f} packages/h, "
+        f"{stats['entries_per_second']:.1f} entries/s, "
+        f"{stats['mean_duration_s']:.1f}s per package"
+    )
+    if stats["top_errors"]:
+        print(f"top errors: {stats['top_errors']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the progress of a mining run")
+    parser.add_argument("ledger", type=str, help="Path to the SQLite ledger")
+    args = parser.parse_args()
+    print_stats(JobLedger(args.ledger).stats())
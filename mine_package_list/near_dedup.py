@@ -0,0 +1,167 @@
+"""Clusters near-duplicate docstrings and code with MinHash and LSH."""
+
+import argparse
+import re
+import zlib
+from typing import Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+_TOKEN = re.compile(r"\w+")
+# Mersenne prime for the universal hash family `(a * x + b) mod p`
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# odd multiplier to fold the rows of an LSH band into one 64-bit key
+_BAND_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def shingles(text: Optional[str], size: int = 3) -> np.ndarray:
+    """Hashes of the word `size`-grams of `text` as unique `uint64`s."""
+    tokens = _TOKEN.findall(text.lower()) if text else []
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    if len(tokens) < size:
+        grams = [" ".join(tokens)]
+    else:
+        grams = [" ".join(tokens[i : i + size]) for i in range(len(tokens) - size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode()) for g in grams), np.uint64, len(grams)))
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, seed: int = 42) -> None:
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        # 32-bit coefficients and 32-bit shingle hashes keep `a * x + b` below 2**64
+        self.a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        if len(hashes) == 0:
+            # empty texts never collide with anything
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        permuted = (np.outer(hashes, self.a) + self.b) % _PRIME
+        return (permuted & _MAX_HASH).min(axis=0).astype(np.uint32)
+
+    def signatures(self, texts: Sequence[Optional[str]], shingle_size: int = 3) -> np.ndarray:
+        # 32-bit minima halve the memory of the signature matrix
+        out = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for i, text in enumerate(texts):
+            out[i] = self.signature(shingles(text, shingle_size))
+        return out
+
+
+def _bands_for(threshold: float, num_perm: int) -> tuple[int, int]:
+    """Picks (bands, rows per band) whose S-curve midpoint `(1/b)**(1/r)` is closest to `threshold`."""
+    best, best_error = (1, num_perm), float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class _UnionFind:
+    def __init__(self, size: int) -> None:
+        self.parent = np.arange(size)
+
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, x: int, y: int) -> None:
+        x, y = self.find(x), self.find(y)
+        if x != y:
+            self.parent[max(x, y)] = min(x, y)
+
+
+def cluster_near_duplicates(
+    signatures: np.ndarray, threshold: float = 0.8, max_bucket_size: int = 1000
+) -> np.ndarray:
+    """
+    returns the cluster id of every row, the smallest row index in its cluster
+    rows with an empty text (all-max signature) are never clustered
+    """
+    num_rows, num_perm = signatures.shape
+    bands, rows_per_band = _bands_for(threshold, num_perm)
+    clusters = _UnionFind(num_rows)
+    non_empty = np.flatnonzero((signatures != np.uint32(_MAX_HASH)).any(axis=1))
+
+    for band in range(bands):
+        chunk = signatures[non_empty, band * rows_per_band : (band + 1) * rows_per_band]
+        # fold the band into one 64-bit key per row, overflow wraps around on purpose
+        keys = np.zeros(len(non_empty), dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for column in chunk.T:
+                keys = keys * _BAND_MULTIPLIER + column.astype(np.uint64)
+
+        # rows sharing a key are adjacent after sorting; pair each with the first of its run
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.ones(len(order), dtype=bool)
+        starts[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        start_positions = np.flatnonzero(starts)
+        run_sizes = np.diff(np.append(start_positions, len(order)))
+        anchor_positions = np.repeat(start_positions, run_sizes)
+        # huge buckets are boilerplate like "Initialize self." and are not verified
+        small = np.repeat(run_sizes <= max_bucket_size, run_sizes)
+        candidates = ~starts & small
+
+        anchors = non_empty[order[anchor_positions[candidates]]]
+        members = non_empty[order[candidates]]
+        # verify candidates with the estimated Jaccard similarity
+        similarity = (signatures[anchors] == signatures[members]).mean(axis=1)
+        for anchor, member in zip(anchors[similarity >= threshold], members[similarity >= threshold]):
+            clusters.union(int(anchor), int(member))
+
+    return np.array([clusters.find(i) for i in range(num_rows)])
+
+
+def near_dedup(
+    in_path: str,
+    out_path: str,
+    columns: Sequence[str] = ("docstring",),
+    threshold: float = 0.8,
+    num_perm: int = 128,
+    collapse: bool = False,
+) -> None:
+    """
+    adds a `near_duplicate_of` column with the row index of each row's cluster representative
+    with `collapse=True` only the representative of every cluster is written
+    """
+    table = pq.read_table(in_path)
+    texts = table.column(columns[0])
+    for column in columns[1:]:
+        texts = pc.binary_join_element_wise(
+            pc.fill_null(texts, ""), pc.fill_null(table.column(column), ""), "\n"
+        )
+    signatures = MinHasher(num_perm).signatures(texts.to_pylist())
+    cluster_ids = cluster_near_duplicates(signatures, threshold)
+
+    table = table.append_column("near_duplicate_of", pa.array(cluster_ids, pa.int64()))
+    if collapse:
+        table = table.filter(pa.array(cluster_ids == np.arange(len(cluster_ids))))
+    pq.write_table(table, out_path, compression="zstd")
+    num_clusters = len(np.unique(cluster_ids))
+    print(f"{len(cluster_ids)} rows in {num_clusters} clusters at Jaccard >= {threshold}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cluster near-duplicate docstrings/code with MinHash LSH")
+    parser.add_argument("--input", type=str, help="Parquet file, e.g. the output of dedup.py", default="corpus_dedup.parquet")
+    parser.add_argument("--out", type=str, help="Output parquet file", default="corpus_near_dedup.parquet")
+    parser.add_argument("--columns", type=str, nargs="+", help="Text columns to compare", default=["docstring"])
+    parser.add_argument("--threshold", type=float, help="Jaccard similarity to merge rows", default=0.8)
+    parser.add_argument("--num_perm", type=int, help="MinHash permutations", default=128)
+    parser.add_argument("--collapse", action="store_true", help="Keep one row per cluster")
+    args = parser.parse_args()
+    near_dedup(args.input, args.out, args.columns, args.threshold, args.num_perm, args.collapse)
@@ -1,14 +1,19 @@
 import subprocess
 import argparse
 from dataclasses import dataclass
-from typing import Optional, Any
+from typing import Optional, Any, Iterator
+from types import ModuleType
+from collections import deque
 import sys
 import os
+import tempfile
 import inspect_sphinx
 import inspect
 from dill.source import getsource
+from source_cache import SourceCache
 import pathlib
-import pandas as pd
+import pkgutil
+from versions import installed_distribution_sha256, read_manifest, write_manifest
 
 
 import importlib
@@ -26,6 +31,21 @@ class SingleEntry:
     code: Optional[str]
     # signature of the class or method
     signature: Optional[str]
+    # `__qualname__` within the module, e.g. `DataFrame.merge`
+    qualname: Optional[str] = None
+
+
+_source_cache = SourceCache()
+
+
+def _getsource(cls_or_method: Any) -> str:
+    # slice from the once-parsed module file, `dill` handles everything else
+    code = _source_cache.getsource(cls_or_method)
+    if code is None:
+        code = getsource(
+            cls_or_method, builtin=True, force=True, lstrip=True, enclosing=True
+        )
+    return code
 
 
 def get_docs_and_code(cls_or_method: Any) -> SingleEntry:
@@ -34,9 +54,7 @@ def get_docs_and_code(cls_or_method: Any) -> SingleEntry:
     except:
         doc = None
     try:
-        code = getsource(
-            cls_or_method, builtin=True, force=True, lstrip=True, enclosing=True
-        )
+        code = _getsource(cls_or_method)
     except:
         code = None
 
@@ -51,6 +69,7 @@ def get_docs_and_code(cls_or_method: Any) -> SingleEntry:
         code=code,
         signature=signature,
         name=cls_or_method.__name__,
+        qualname=getattr(cls_or_method, "__qualname__", None),
     )
 
 
@@ -63,31 +82,93 @@ def test_get_docs_and_code():
     assert entry.docstring == LlamaPreTrainedModel.__doc__
 
 
-def _recursive_package_list_modules(package: object):
-    # get all classes from a package
-    for name, obj in inspect.getmembers(package):
-        if inspect.isfunction(obj):
-            yield obj
-        if inspect.isclass(obj):
-            yield obj
-            for name, obj in inspect.getmembers(obj):
-                if inspect.isfunction(obj):
-                    yield obj
-
-        elif inspect.ismodule(obj):
+# submodules that are not API surface; importing `__main__` would even run a CLI
+_SKIP_SUBMODULES = {"__main__", "conftest", "setup", "test", "tests"}
+
+
+def _in_namespace(name: Optional[str], root: str) -> bool:
+    return isinstance(name, str) and (name == root or name.startswith(root + "."))
+
+
+def _iter_package_modules(package: ModuleType, max_depth: int) -> Iterator[ModuleType]:
+    # breadth-first over the submodules, importing each one only when it is reached
+    root = package.__name__
+    seen = {root}
+    queue = deque([(package, 0)])
+    while queue:
+        module, depth = queue.popleft()
+        yield module
+        if depth >= max_depth or not hasattr(module, "__path__"):
+            continue
+        try:
+            submodules = list(
+                pkgutil.iter_modules(module.__path__, prefix=module.__name__ + ".")
+            )
+        except Exception:
+            continue
+        for info in submodules:
+            if info.name in seen or info.name.rsplit(".", 1)[-1] in _SKIP_SUBMODULES:
+                continue
+            seen.add(info.name)
             try:
-                yield from _recursive_package_list_modules(obj.__name__)
-            except:
+                submodule = importlib.import_module(info.name)
+            except BaseException:
+                # broken optional modules, `sys.exit()` in scripts, ...
                 continue
+            if _in_namespace(getattr(submodule, "__name__", None), root):
+                queue.append((submodule, depth + 1))
 
 
-def get_all_docstrings_and_code(package_name: str) -> list[SingleEntry]:
+def _iter_package_members(package: ModuleType, max_depth: int = 16) -> Iterator[Any]:
+    """
+    yields every function, class and method defined in the package exactly once,
+    skipping members re-exported from other packages
+    """
+    root = package.__name__
+    seen_ids = set()
+    seen_names = set()
+
+    def first_visit(obj: Any) -> bool:
+        if not _in_namespace(getattr(obj, "__module__", None), root):
+            return False
+        qualified_name = f"{obj.__module__}.{getattr(obj, '__qualname__', '')}"
+        if id(obj) in seen_ids or qualified_name in seen_names:
+            return False
+        seen_ids.add(id(obj))
+        seen_names.add(qualified_name)
+        return True
+
+    for module in _iter_package_modules(package, max_depth):
+        try:
+            members = inspect.getmembers(module)
+        except Exception:
+            continue
+        for _, obj in members:
+            if inspect.isfunction(obj) and first_visit(obj):
+                yield obj
+            elif inspect.isclass(obj) and first_visit(obj):
+                yield obj
+                try:
+                    methods = inspect.getmembers(obj, inspect.isfunction)
+                except Exception:
+                    continue
+                for _, method in methods:
+                    if first_visit(method):
+                        yield method
+
+
+def iter_all_docstrings_and_code(package_name: str) -> Iterator[SingleEntry]:
     # get all classes from a package
     package = importlib.import_module(package_name)
-    all_classes = _recursive_package_list_modules(package)
+    global _source_cache
+    _source_cache = SourceCache()
+    for cls in _iter_package_members(package):
+        yield get_docs_and_code(cls)
+
 
+def get_all_docstrings_and_code(package_name: str) -> list[SingleEntry]:
     # get docstrings and code of all classes
-    return [get_docs_and_code(cls) for cls in all_classes]
+    return list(iter_all_docstrings_and_code(package_name))
 
 
 def test_get_all_docstrings_and_code(library_name: str = "transformers"):
@@ -108,25 +189,107 @@ def test_get_all_docstrings_and_code(library_name: str = "transformers"):
     assert all([entry.package.startswith("transformers") for entry in entries])
 
 
-def package_to_s3parquet(package_name: str, s3_bucket: Optional[str]):
+class MiningError(Exception):
+    """raised for a package that failed in the mining subprocess"""
+
+    def __init__(self, package_name: str, error: str) -> None:
+        super().__init__(f"mining {package_name} failed with {error}")
+        # exception class name raised in the subprocess
+        self.error = error
+
+
+def _mine_in_subprocess(package_name: str, s3_bucket: str, version: Optional[str]) -> int:
+    """
+    installs the package with its dependencies into a fresh directory and mines it in a new interpreter
+    with that directory first on `sys.path`, so the package only ever sees the versions uv resolved for it
+    and no module, C extensions included, is loaded twice or shared between packages
+    """
+    requirement = f"{package_name}=={version}" if version else package_name
+    with tempfile.TemporaryDirectory(prefix="mine-") as target:
+        subprocess.check_call(
+            ["uv", "pip", "install", "--python", sys.executable, "--target", target, requirement]
+        )
+        print(f"installing package {package_name} done.")
+        error_file = os.path.join(target, ".mine-error")
+        command = [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--package", package_name,
+            "--s3_bucket", s3_bucket,
+            "--installed",
+            "--error_file", error_file,
+        ]
+        if version:
+            command += ["--version", version]
+        python_path = [target] + [p for p in [os.environ.get("PYTHONPATH")] if p]
+        returncode = subprocess.call(command, env=dict(os.environ, PYTHONPATH=os.pathsep.join(python_path)))
+        if returncode != 0:
+            try:
+                with open(error_file) as f:
+                    error = f.read().strip()
+            except OSError:
+                # killed, or crashed in a C extension
+                error = f"ExitCode{returncode}"
+            raise MiningError(package_name, error)
+    return read_manifest(s3_bucket, package_name)["num_entries"]
+
+
+def package_to_s3parquet(
+    package_name: str,
+    s3_bucket: Optional[str],
+    static: bool = False,
+    version: Optional[str] = None,
+    installed: bool = False,
+) -> int:
     """
     gets all docstrings and code of a package and saves it to a parquet file
     pushes the parquet file to s3
+
+    with `static=True` the sdist/wheel is downloaded and parsed with `ast`
+    instead of being installed and imported.
+    `version` pins the release to mine; it is stored with the artifact hash
+    in a manifest next to the parquet, see `versions.py`
+    otherwise the package is installed and mined in a subprocess, `installed=True` is that subprocess
     """
-    os.environ["VIRTUAL_ENV"] = sys.prefix
-    subprocess.check_call(["uv", "pip", "install", package_name])
-    # get all docstrings and code of the package
-    print(f"installing package {package_name} done.")
-    package_name = package_name.replace("-", "_")
-    entries = get_all_docstrings_and_code(package_name)
-    # convert to a pandas dataframe
-    df = pd.DataFrame([entry.__dict__ for entry in entries])
-
-    path = s3_bucket + f"/{package_name}.parquet"
-
-    # save to parquet
-    df.to_parquet(path)
+    if not static and not installed:
+        return _mine_in_subprocess(package_name, s3_bucket, version)
+
+    from sink import ParquetSink
+
+    path = s3_bucket + f"/{package_name.replace('-', '_')}.parquet"
+    if static:
+        from static_parse import (
+            download_artifact,
+            find_artifact,
+            iter_all_docstrings_and_code_static,
+        )
+
+        artifact = find_artifact(package_name, version)
+        artifact_sha256 = artifact["digests"]["sha256"]
+        manifest = read_manifest(s3_bucket, package_name)
+        if manifest and manifest["artifact_sha256"] == artifact_sha256:
+            # same artifact under a new version label, nothing to re-extract
+            write_manifest(
+                s3_bucket, package_name, version, artifact_sha256, manifest["num_entries"]
+            )
+            print(f"package {package_name} is unchanged, skipping.")
+            return manifest["num_entries"]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            artifact_path, _ = download_artifact(package_name, tmp_dir, file=artifact)
+            print(f"downloading package {package_name} done.")
+            with ParquetSink(path) as sink:
+                sink.write_all(iter_all_docstrings_and_code_static(artifact_path))
+    else:
+        # inside the mining subprocess, the package is importable already
+        artifact_sha256 = installed_distribution_sha256(package_name)
+        # stream entries into parquet row groups instead of collecting them first
+        with ParquetSink(path) as sink:
+            sink.write_all(iter_all_docstrings_and_code(package_name.replace("-", "_")))
+
+    write_manifest(s3_bucket, package_name, version, artifact_sha256, sink.num_rows)
     print(f"Exported parquet to {path}")
+    return sink.num_rows
 
 
 if __name__ == "__main__":
@@ -138,5 +301,45 @@ if __name__ == "__main__":
     parser.add_argument(
         "--s3_bucket", type=str, help="Output bucket / base in s3", default=""
     )
+    parser.add_argument(
+        "--static",
+        action="store_true",
+        help="Parse the downloaded sdist/wheel with `ast` instead of installing and importing it",
+    )
+    parser.add_argument(
+        "--ledger", type=str, help="SQLite job ledger to record the outcome in", default=""
+    )
+    parser.add_argument(
+        "--version", type=str, help="Release of the package to mine", default=None
+    )
+    parser.add_argument(
+        "--installed",
+        action="store_true",
+        help="Mine the package importable from this interpreter, used by the mining subprocess",
+    )
+    parser.add_argument(
+        "--error_file", type=str, help="File the exception class name is written to on failure", default=""
+    )
     args = parser.parse_args()
-    package_to_s3parquet(args.package, args.s3_bucket)
+    if args.installed:
+        try:
+            package_to_s3parquet(args.package, args.s3_bucket, version=args.version, installed=True)
+        except BaseException as e:
+            if args.error_file:
+                with open(args.error_file, "w") as f:
+                    f.write(type(e).__name__)
+            raise
+    elif args.ledger:
+        from driver import mine_package, record_result
+        from ledger import STATUS_OK, JobLedger
+
+        result = mine_package(
+            args.package, args.s3_bucket, static=args.static, version=args.version
+        )
+        record_result(JobLedger(args.ledger), result)
+        if result.status != STATUS_OK:
+            sys.exit(f"mining {args.package} failed with {result.error}")
+    else:
+        package_to_s3parquet(
+            args.package, args.s3_bucket, static=args.static, version=args.version
+        )
@@ -0,0 +1,83 @@
+"""Streams mined entries into a Parquet file one row group at a time."""
+
+import dataclasses
+import os
+from typing import Iterable, Optional
+
+import pyarrow as pa
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from parse import SingleEntry
+
+SCHEMA = pa.schema(
+    [pa.field(field.name, pa.string()) for field in dataclasses.fields(SingleEntry)]
+)
+DICTIONARY_COLUMNS = ["package", "name"]
+COMPRESSION = {
+    "package": "snappy",
+    "name": "snappy",
+    "signature": "snappy",
+    # nearly unique per file, so plain encoded
+    "qualname": "snappy",
+    "docstring": "zstd",
+    "code": "zstd",
+}
+
+
+def _resolve(path: str) -> tuple[pafs.FileSystem, str]:
+    if "://" in path:
+        return pafs.FileSystem.from_uri(path)
+    return pafs.LocalFileSystem(), os.path.abspath(path)
+
+
+class ParquetSink:
+    """
+    Writes `SingleEntry` rows to `path` every `row_group_size` rows, moved into place on a clean close.
+    If mining raises, the rows written so far are kept in `{path}.partial`.
+    """
+
+    def __init__(self, path: str, row_group_size: int = 4096) -> None:
+        self.filesystem, self.path = _resolve(path)
+        self.tmp_path = self.path + ".tmp"
+        self.row_group_size = row_group_size
+        self.num_rows = 0
+        self._columns: dict[str, list[Optional[str]]] = {name: [] for name in SCHEMA.names}
+        self._writer = pq.ParquetWriter(
+            self.tmp_path,
+            SCHEMA,
+            filesystem=self.filesystem,
+            use_dictionary=DICTIONARY_COLUMNS,
+            compression=COMPRESSION,
+        )
+
+    def write(self, entry: SingleEntry) -> None:
+        for name, column in self._columns.items():
+            column.append(getattr(entry, name))
+        self.num_rows += 1
+        if len(self._columns["name"]) >= self.row_group_size:
+            self.flush()
+
+    def write_all(self, entries: Iterable[SingleEntry]) -> None:
+        for entry in entries:
+            self.write(entry)
+
+    def flush(self) -> None:
+        if not self._columns["name"]:
+            return
+        batch = pa.record_batch(list(self._columns.values()), schema=SCHEMA)
+        self._writer.write_batch(batch, row_group_size=self.row_group_size)
+        for column in self._columns.values():
+            column.clear()
+
+    def close(self, success: bool = True) -> None:
+        self.flush()
+        self._writer.close()
+        target = self.path if success else self.path + ".partial"
+        self.filesystem.move(self.tmp_path, target)
+
+    def __enter__(self) -> "ParquetSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close(success=exc_type is None)
@@ -0,0 +1,114 @@
+"""Slices object sources from one cached AST per file instead of re-parsing it per object."""
+
+import ast
+import inspect
+import tokenize
+from typing import Any, Optional
+
+
+def _indentsize(line: str) -> int:
+    expanded = line.expandtabs()
+    return len(expanded) - len(expanded.lstrip())
+
+
+def _block_end(node: ast.AST, lines: list[str]) -> int:
+    # like `inspect.getblock`, trailing comments indented at least as deep as the body
+    # belong to the block, up to the next line of code
+    end = node.end_lineno
+    body_col = node.body[0].col_offset
+    for lineno in range(node.end_lineno + 1, len(lines) + 1):
+        stripped = lines[lineno - 1].strip()
+        if not stripped:
+            continue
+        if not stripped.startswith("#"):
+            break
+        if _indentsize(lines[lineno - 1]) >= body_col:
+            end = lineno
+    return end
+
+
+def node_source(node: ast.AST, lines: list[str]) -> str:
+    """
+    slices the source of a definition like `dill.source.getsource(..., lstrip=True)`:
+    functions start at their first decorator, classes at the `class` line, and the block
+    is outdented by the first line's indent, which also drops blank lines of indented blocks
+    """
+    start = node.lineno
+    if not isinstance(node, ast.ClassDef):
+        start = min([start] + [d.lineno for d in node.decorator_list])
+    block = lines[start - 1 : _block_end(node, lines)]
+    indent = _indentsize(block[0])
+    return "".join(line[min(indent, _indentsize(line)) :] for line in block)
+
+
+class _ParsedFile:
+    def __init__(self, path: str) -> None:
+        with tokenize.open(path) as f:
+            source = f.read()
+        self.lines = source.splitlines(keepends=True)
+        # first line (including decorators) -> function definition, matching `co_firstlineno`
+        self.functions: dict[int, ast.AST] = {}
+        # `Outer.Inner` -> class definition, matching `__qualname__`
+        self.classes: dict[str, ast.ClassDef] = {}
+        self._index(ast.parse(source).body, prefix="")
+
+    def _index(self, body: list[ast.stmt], prefix: str) -> None:
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                self.functions.setdefault(start, node)
+            elif isinstance(node, ast.ClassDef):
+                qualname = prefix + node.name
+                self.classes.setdefault(qualname, node)
+                self._index(node.body, prefix=qualname + ".")
+            elif isinstance(node, (ast.If, ast.Try)):
+                # conditional definitions live in the same namespace
+                self._index(node.body, prefix)
+                for handler in getattr(node, "handlers", []):
+                    self._index(handler.body, prefix)
+                self._index(node.orelse, prefix)
+                self._index(getattr(node, "finalbody", []), prefix)
+
+
+class SourceCache:
+    def __init__(self) -> None:
+        self.files: dict[str, Optional[_ParsedFile]] = {}
+
+    def _parsed(self, obj: Any) -> Optional[_ParsedFile]:
+        try:
+            path = inspect.getsourcefile(obj)
+        except TypeError:
+            # builtins and C extensions have no source file
+            return None
+        if path is None:
+            return None
+        if path not in self.files:
+            try:
+                self.files[path] = _ParsedFile(path)
+            except (OSError, SyntaxError, ValueError):
+                self.files[path] = None
+        return self.files[path]
+
+    def getsource(self, obj: Any) -> Optional[str]:
+        """Returns the dedented source of `obj`, or `None` if it cannot be sliced from the cache."""
+        qualname = getattr(obj, "__qualname__", "")
+        if "<locals>" in qualname or hasattr(obj, "__wrapped__"):
+            # `dill` returns the enclosing function or follows the wrapper for these
+            return None
+        if inspect.isfunction(obj):
+            parsed = self._parsed(obj)
+            if parsed is None:
+                return None
+            node = parsed.functions.get(obj.__code__.co_firstlineno)
+            if node is None or node.name != obj.__name__:
+                return None
+            return node_source(node, parsed.lines)
+        if inspect.isclass(obj):
+            parsed = self._parsed(obj)
+            if parsed is None:
+                return None
+            node = parsed.classes.get(qualname)
+            if node is None:
+                return None
+            return node_source(node, parsed.lines)
+        return None
@@ -0,0 +1,277 @@
+"""Extracts docstrings, code and signatures from sdists and wheels with `ast`, without importing them."""
+
+from __future__ import annotations
+
+import ast
+import io
+import json
+import os
+import tarfile
+import tokenize
+import urllib.parse
+import urllib.request
+import zipfile
+from typing import Iterator, Optional, Union
+
+import inspect_sphinx
+from parse import SingleEntry
+from source_cache import node_source
+
+_FunctionNode = Union[ast.FunctionDef, ast.AsyncFunctionDef]
+
+PYPI_JSON_URL = "https://pypi.org/pypi/{name}/json"
+
+# top-level files of an sdist that are never part of the importable package
+_SDIST_SKIP = {"setup.py", "conftest.py", "noxfile.py", "fabfile.py"}
+# top-level directories of an sdist that hold tests and docs rather than the package
+_SDIST_SKIP_DIRS = {"tests", "test", "testing", "docs", "doc", "examples", "benchmarks"}
+
+
+def _decode_source(data: bytes) -> str:
+    # honour PEP 263 coding cookies, like the import system would
+    try:
+        encoding, _ = tokenize.detect_encoding(io.BytesIO(data).readline)
+    except SyntaxError:
+        encoding = "utf-8"
+    return data.decode(encoding, errors="replace")
+
+
+def _iter_archive_files(artifact_path: str) -> Iterator[tuple[str, bytes]]:
+    """Yields (relative path, content) for every `.py` file in a wheel, sdist or directory."""
+    if os.path.isdir(artifact_path):
+        for root, _, files in os.walk(artifact_path):
+            for file in files:
+                if file.endswith(".py"):
+                    full_path = os.path.join(root, file)
+                    rel_path = os.path.relpath(full_path, artifact_path)
+                    with open(full_path, "rb") as f:
+                        yield rel_path.replace(os.sep, "/"), f.read()
+    elif artifact_path.endswith((".whl", ".zip")):
+        with zipfile.ZipFile(artifact_path) as archive:
+            for info in archive.infolist():
+                if info.filename.endswith(".py") and not info.is_dir():
+                    yield info.filename, archive.read(info)
+    else:
+        with tarfile.open(artifact_path) as archive:
+            for member in archive:
+                if member.isfile() and member.name.endswith(".py"):
+                    f = archive.extractfile(member)
+                    if f is not None:
+                        yield member.name, f.read()
+
+
+def _wheel_module_path(path: str) -> Optional[str]:
+    parts = path.split("/")
+    if parts[0].endswith(".dist-info"):
+        return None
+    if parts[0].endswith(".data"):
+        # `{name}.data/purelib/...` and `{name}.data/platlib/...` are installed into site-packages
+        if len(parts) < 3 or parts[1] not in ("purelib", "platlib"):
+            return None
+        parts = parts[2:]
+    return "/".join(parts)
+
+
+def _sdist_module_paths(paths: list[str]) -> dict[str, str]:
+    """Maps sdist file paths to their paths relative to the import root."""
+    stripped = {}
+    for path in paths:
+        parts = path.split("/")
+        # drop the `{name}-{version}/` root directory and an optional `src/` layout
+        if len(parts) > 1:
+            parts = parts[1:]
+        if len(parts) > 1 and parts[0] == "src":
+            parts = parts[1:]
+        stripped[path] = "/".join(parts)
+
+    # only keep modules that are importable, i.e. every parent directory is a package
+    packages = {
+        rel_path.rsplit("/", 1)[0]
+        for rel_path in stripped.values()
+        if rel_path.endswith("/__init__.py")
+    }
+    module_paths = {}
+    for path, rel_path in stripped.items():
+        parts = rel_path.split("/")
+        if parts[0] in _SDIST_SKIP_DIRS:
+            continue
+        if len(parts) == 1:
+            if parts[0] not in _SDIST_SKIP:
+                module_paths[path] = rel_path
+            continue
+        parents = ["/".join(parts[:i]) for i in range(1, len(parts))]
+        if all(parent in packages for parent in parents):
+            module_paths[path] = rel_path
+    return module_paths
+
+
+def module_name_from_path(rel_path: str) -> Optional[str]:
+    """Converts `pkg/sub/mod.py` into `pkg.sub.mod` and `pkg/__init__.py` into `pkg`."""
+    parts = rel_path[: -len(".py")].split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    if not parts or not all(part.isidentifier() for part in parts):
+        return None
+    return ".".join(parts)
+
+
+def iter_artifact_modules(artifact_path: str) -> Iterator[tuple[str, str]]:
+    """Yields (module name, source) for every importable module of an artifact."""
+    files = dict(_iter_archive_files(artifact_path))
+    if artifact_path.endswith(".whl") or os.path.isdir(artifact_path):
+        module_paths = {path: _wheel_module_path(path) for path in files}
+    else:
+        module_paths = _sdist_module_paths(list(files))
+
+    for path, rel_path in module_paths.items():
+        if rel_path is None:
+            continue
+        module_name = module_name_from_path(rel_path)
+        if module_name is None:
+            continue
+        yield module_name, _decode_source(files[path])
+
+
+def _get_signature(node: ast.AST, source: str) -> Optional[str]:
+    try:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return str(inspect_sphinx.signature_from_ast(node, source))
+        # classes are called through `__init__`, whose first argument is bound
+        for child in node.body:
+            if (
+                isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+                and child.name == "__init__"
+            ):
+                sig = inspect_sphinx.signature_from_ast(child, source)
+                return str(sig.replace(parameters=list(sig.parameters.values())[1:]))
+    except Exception:
+        pass
+    return None
+
+
+def get_static_docs_and_code(
+    node: Union[_FunctionNode, ast.ClassDef],
+    module_name: str,
+    source: str,
+    lines: list[str],
+    qualname: Optional[str] = None,
+) -> SingleEntry:
+    return SingleEntry(
+        package=module_name,
+        docstring=ast.get_docstring(node, clean=False),
+        code=node_source(node, lines),
+        signature=_get_signature(node, source),
+        name=node.name,
+        qualname=qualname or node.name,
+    )
+
+
+def _iter_definitions(body: list[ast.stmt]) -> Iterator[ast.stmt]:
+    # also look into conditional definitions, e.g. `if sys.version_info >= ...:` or `try: ...`
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            yield node
+        elif isinstance(node, ast.If):
+            yield from _iter_definitions(node.body)
+            yield from _iter_definitions(node.orelse)
+        elif isinstance(node, ast.Try):
+            yield from _iter_definitions(node.body)
+            for handler in node.handlers:
+                yield from _iter_definitions(handler.body)
+            yield from _iter_definitions(node.orelse)
+            yield from _iter_definitions(node.finalbody)
+
+
+def iter_module_entries(module_name: str, source: str) -> Iterator[SingleEntry]:
+    """Yields the functions, classes and methods defined in one module source."""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        # e.g. Python 2 only modules or templates shipped as `.py`
+        return
+    lines = source.splitlines(keepends=True)
+    for node in _iter_definitions(tree.body):
+        yield get_static_docs_and_code(node, module_name, source, lines)
+        if isinstance(node, ast.ClassDef):
+            for method in _iter_definitions(node.body):
+                if isinstance(method, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    yield get_static_docs_and_code(
+                        method, module_name, source, lines, f"{node.name}.{method.name}"
+                    )
+
+
+def iter_all_docstrings_and_code_static(artifact_path: str) -> Iterator[SingleEntry]:
+    # get all docstrings and code of an sdist, wheel or unpacked source tree
+    for module_name, source in iter_artifact_modules(artifact_path):
+        yield from iter_module_entries(module_name, source)
+
+
+def get_all_docstrings_and_code_static(artifact_path: str) -> list[SingleEntry]:
+    return list(iter_all_docstrings_and_code_static(artifact_path))
+
+
+def _pick_release_file(files: list[dict]) -> dict:
+    # pure-Python wheels first, then the sdist, then any other wheel
+    def rank(file: dict) -> int:
+        if file["packagetype"] == "bdist_wheel" and file["filename"].endswith("-none-any.whl"):
+            return 0
+        if file["packagetype"] == "sdist":
+            return 1
+        if file["packagetype"] == "bdist_wheel":
+            return 2
+        return 3
+
+    candidates = [file for file in files if not file.get("yanked") and rank(file) < 3]
+    if not candidates:
+        raise ValueError("no wheel or sdist available")
+    return min(candidates, key=rank)
+
+
+def find_artifact(package_name: str, version: Optional[str] = None) -> dict:
+    """
+    looks up the wheel or sdist to mine in the PyPI JSON API
+    returns the release file with an absolute `url` and its `digests`
+    """
+    url = PYPI_JSON_URL.format(name=package_name)
+    with urllib.request.urlopen(url, timeout=60) as response:
+        project = json.load(response)
+
+    files = project["releases"][version] if version else project["urls"]
+    file = dict(_pick_release_file(files))
+    # mirrors of the JSON API may return links relative to the metadata URL
+    file["url"] = urllib.parse.urljoin(url, file["url"])
+    return file
+
+
+def download_artifact(
+    package_name: str,
+    dest_dir: str,
+    version: Optional[str] = None,
+    file: Optional[dict] = None,
+) -> tuple[str, str]:
+    """
+    downloads a wheel or sdist of a package from PyPI without running any of its code
+    returns the local path and the sha256 of the artifact
+    """
+    if file is None:
+        file = find_artifact(package_name, version)
+    path = os.path.join(dest_dir, file["filename"])
+    urllib.request.urlretrieve(file["url"], path)
+    return path, file["digests"]["sha256"]
+
+
+def test_get_all_docstrings_and_code_static():
+    # mine the standard library `json` package from its source directory
+    import json as json_module
+
+    source_dir = os.path.dirname(os.path.dirname(json_module.__file__))
+    entries = [
+        entry
+        for module_name, source in iter_artifact_modules(os.path.join(source_dir, "json"))
+        for entry in iter_module_entries("json." + module_name, source)
+    ]
+    names = {entry.name for entry in entries}
+    assert {"JSONDecodeError", "JSONDecoder", "decode"} <= names
+    decoder = next(entry for entry in entries if entry.name == "JSONDecoder")
+    assert decoder.docstring == json_module.JSONDecoder.__doc__
+    assert decoder.code.startswith("class JSONDecoder(object):")
@@ -0,0 +1,85 @@
+"""Manifests of the version and artifact each package was mined from, to skip unchanged packages."""
+
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Optional
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def normalize_name(package_name: str) -> str:
+    # PEP 503 normalization, so `Foo_Bar`, `foo-bar` and `foo.bar` compare equal
+    return re.sub(r"[-_.]+", "-", package_name).lower()
+
+
+def load_pypi_versions(path: str) -> dict[str, str]:
+    """Reads `pypi_name` -> `pypi_version` from the BigQuery export (see `bigquery.sql`)."""
+    versions = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if row.get("pypi_name") and row.get("pypi_version"):
+                versions[normalize_name(row["pypi_name"])] = row["pypi_version"]
+    return versions
+
+
+def manifest_path(out_dir: str, package_name: str) -> str:
+    return out_dir + f"/{package_name.replace('-', '_')}{MANIFEST_SUFFIX}"
+
+
+def read_manifest(out_dir: str, package_name: str) -> Optional[dict]:
+    try:
+        with open(manifest_path(out_dir, package_name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(
+    out_dir: str,
+    package_name: str,
+    pypi_version: Optional[str],
+    artifact_sha256: Optional[str],
+    num_entries: int,
+) -> None:
+    manifest = {
+        "package": package_name,
+        "pypi_version": pypi_version,
+        "artifact_sha256": artifact_sha256,
+        "num_entries": num_entries,
+        "mined_at": time.time(),
+    }
+    # write-then-rename, so a crash never leaves a manifest without its parquet
+    path = manifest_path(out_dir, package_name)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def is_up_to_date(out_dir: str, package_name: str, pypi_version: Optional[str]) -> bool:
+    if pypi_version is None:
+        return False
+    manifest = read_manifest(out_dir, package_name)
+    return manifest is not None and manifest.get("pypi_version") == pypi_version
+
+
+def installed_distribution_sha256(package_name: str) -> Optional[str]:
+    """
+    fingerprints an installed distribution by hashing its `RECORD`,
+    which lists the sha256 of every installed file
+    """
+    from importlib import invalidate_caches, metadata
+
+    invalidate_caches()
+    try:
+        record = metadata.distribution(package_name).read_text("RECORD")
+    except metadata.PackageNotFoundError:
+        return None
+    if record is None:
+        return None
+    return hashlib.sha256(record.encode()).hexdigest()
@@ -1,16 +1,56 @@
 from io import StringIO
 import tokenize
+import multiprocessing as mp
+from typing import Optional
 import pandas as pd
-from pprint import pprint
 
 
-def clean_dataset(parquet_path: str, out_path: str):
-    df = read_parquet(parquet_path)
-    df["func_code_string"] = df["func_code_string"].apply(remove_comments_and_docstrings)
-    cleaned_df = df[df["func_code_string"] != ""]
-    cleaned_df.to_parquet(out_path, engine='fastparquet')
+def clean_dataset(
+    parquet_path: str,
+    out_path: str,
+    num_proc: Optional[int] = None,
+    chunk_size: int = 4096,
+    streaming: bool = False,
+    batch_size: int = 65536,
+):
+    """
+    Strips comments and docstrings from `func_code_string` with `num_proc` processes.
+    With `streaming=True` the input is read and written one row group at a time,
+    so memory stays bounded by `batch_size` rows instead of the whole file.
+    """
+    with mp.Pool(num_proc) as pool:
+        if streaming:
+            _clean_parquet_streaming(parquet_path, out_path, pool, chunk_size, batch_size)
+        else:
+            df = read_parquet(parquet_path)
+            df["func_code_string"] = clean_column(df["func_code_string"].tolist(), pool, chunk_size)
+            cleaned_df = df[df["func_code_string"] != ""]
+            cleaned_df.to_parquet(out_path, engine='fastparquet')
     print("Done!")
 
+def _clean_parquet_streaming(parquet_path: str, out_path: str, pool, chunk_size: int, batch_size: int):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(parquet_path)
+    writer = pq.ParquetWriter(out_path, parquet_file.schema_arrow)
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        column = batch.schema.get_field_index("func_code_string")
+        # keep the input type, e.g. `large_string` written by pandas, so the writer schema matches
+        cleaned = pa.array(clean_column(batch.column(column).to_pylist(), pool, chunk_size), batch.schema.field(column).type)
+        table = pa.Table.from_batches([batch]).set_column(column, "func_code_string", cleaned)
+        writer.write_table(table.filter(pc.not_equal(cleaned, "")))
+    writer.close()
+
+def clean_column(sources: list, pool, chunk_size: int) -> list:
+    # ordered map over chunks, so every worker call amortizes the IPC of `chunk_size` rows
+    chunks = (sources[i:i + chunk_size] for i in range(0, len(sources), chunk_size))
+    return [out for chunk in pool.imap(clean_batch, chunks) for out in chunk]
+
+def clean_batch(sources: list) -> list:
+    return [remove_comments_and_docstrings(source) for source in sources]
+
 def read_parquet(parquet_path: str):
     df = pd.read_parquet(parquet_path, engine='fastparquet')
     return df
@@ -26,7 +66,8 @@ def _remove_comments_and_docstrings(source):
     Returns 'source' minus comments and docstrings.
     """
     io_obj = StringIO(source)
-    out = ""
+    # collect the pieces and join once, `out +=` copies the whole string every time
+    out = []
     prev_toktype = tokenize.INDENT
     last_lineno = -1
     last_col = 0
@@ -44,7 +85,7 @@ def _remove_comments_and_docstrings(source):
         if start_line > last_lineno:
             last_col = 0
         if start_col > last_col:
-            out += (" " * (start_col - last_col))
+            out.append(" " * (start_col - last_col))
         # Remove comments:
         if token_type == tokenize.COMMENT:
             pass
@@ -61,7 +102,7 @@ def _remove_comments_and_docstrings(source):
                     # Catch whole-module docstrings:
                     if start_col > 0:
                         # Unlabelled indentation means we're inside an operator
-                        out += token_string
+                        out.append(token_string)
                     # Note regarding the INDENT token: The tokenize module does
                     # not label indentation inside of an operator (parens,
                     # brackets, and curly braces) as actual indentation.
@@ -72,13 +113,11 @@ def _remove_comments_and_docstrings(source):
                     #         "The spaces before this string do not get a token"
                     #     ]
         else:
-            out += token_string
+            out.append(token_string)
         prev_toktype = token_type
         last_col = end_col
         last_lineno = end_line
-    pprint(out)
-    pprint("-------------------------------------------------")
-    return out
+    return "".join(out)
 
 
 if __name__ == "__main__":